@@ -0,0 +1,165 @@
+"""
+Contains the admission controller that limits how many visitors are at each enclosure and how
+often a visitor can wave at, feed or photograph the primates.
+
+Visitors waiting for a full enclosure queue in arrival order and are given an estimated wait,
+based on how long recent visits lasted. Once a queue reaches max_queue, new visitors are turned
+away straight away instead of piling up, so the enclosures keep their throughput under overload.
+Actions are limited per visitor with a token bucket. A visitor idle long enough for their bucket to
+fill up again is forgotten, as a new bucket would be the same, so the buckets don't grow without
+bound as visitors come and go.
+"""
+
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class EnclosureFull(Exception):
+    """Raised when a visitor can't get into an enclosure, with the estimated wait in seconds."""
+
+    def __init__(self, group: str, wait: float):
+        super().__init__(f"The {group} enclosure is full. The estimated wait is {round(wait)} seconds.")
+        self.group = group
+        self.wait = wait
+
+
+class TokenBucket():
+    """Allows up to burst actions at once, refilling at rate actions per second."""
+
+    def __init__(self, rate: float, burst: int, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = float(burst)
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def allow(self) -> bool:
+        """Takes a token if there is one and returns whether the action is allowed."""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def retry_after(self) -> float:
+        """Returns the number of seconds until the next token is available."""
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class AdmissionController():
+    """Limits the visitors at each enclosure and the rate of each visitor's actions."""
+
+    def __init__(self, capacity: int = 10, capacities: dict = None, max_queue: int = 50,
+                 action_rate: float = 1.0, action_burst: int = 5, visit_time: float = 60.0, clock=time.monotonic):
+        self.capacity = capacity
+        self.capacities = capacities or {}
+        self.max_queue = max_queue
+        self.action_rate = action_rate
+        self.action_burst = action_burst
+        self.condition = threading.Condition()
+        self.inside = {}
+        self.queues = {}
+        # Average length of a visit to each enclosure, in seconds
+        self.visit_times = {}
+        self.default_visit_time = visit_time
+        self.buckets = {}
+        # The time actions are rate limited by, which a replay sets to the times of its recording
+        self.clock = clock
+        # Seconds after which an idle visitor's bucket is full again
+        self.idle_time = action_burst / action_rate
+        self._expired = clock()
+        self._tickets = itertools.count()
+
+    def capacity_for(self, group: str) -> int:
+        return self.capacities.get(group, self.capacity)
+
+    def estimated_wait(self, group: str, position: int = None) -> float:
+        """Returns the estimated wait in seconds for the visitor at position in the queue (by default a new arrival)."""
+        with self.condition:
+            queue = self.queues.get(group, ())
+            if position is None:
+                position = len(queue)
+            capacity = self.capacity_for(group)
+            if self.inside.get(group, 0) + position < capacity:
+                return 0.0
+            # Visitors leave one capacity's worth at a time, each group taking about one visit
+            rounds = position // capacity + 1
+            return rounds * self.visit_times.get(group, self.default_visit_time)
+
+    def enter(self, group: str, timeout: float = None) -> float:
+        """
+        Waits in a fair queue until there is room in the enclosure and returns the time entered.
+        Raises EnclosureFull if the queue is already full or the timeout runs out.
+        """
+        with self.condition:
+            queue = self.queues.setdefault(group, deque())
+            if len(queue) >= self.max_queue:
+                raise EnclosureFull(group, self.estimated_wait(group))
+
+            ticket = next(self._tickets)
+            queue.append(ticket)
+            deadline = None if timeout is None else time.monotonic() + timeout
+            try:
+                while queue[0] != ticket or self.inside.get(group, 0) >= self.capacity_for(group):
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise EnclosureFull(group, self.estimated_wait(group, queue.index(ticket)))
+                    self.condition.wait(remaining)
+            except BaseException:
+                queue.remove(ticket)
+                self.condition.notify_all()
+                raise
+            queue.popleft()
+            self.inside[group] = self.inside.get(group, 0) + 1
+            # The next visitor in the queue may also fit
+            self.condition.notify_all()
+            return time.monotonic()
+
+    def leave(self, group: str, entered: float):
+        """Frees a place in the enclosure and updates the average visit time."""
+        with self.condition:
+            self.inside[group] -= 1
+            average = self.visit_times.get(group, self.default_visit_time)
+            self.visit_times[group] = 0.8 * average + 0.2 * (time.monotonic() - entered)
+            self.condition.notify_all()
+
+    @contextmanager
+    def visit(self, group: str, timeout: float = None):
+        """Context manager that enters the enclosure and leaves it again afterwards."""
+        entered = self.enter(group, timeout)
+        try:
+            yield
+        finally:
+            self.leave(group, entered)
+
+    def _expire_buckets(self):
+        """Forgets the visitors that have been idle for idle_time. Takes one pass every idle_time."""
+        now = self.clock()
+        if now - self._expired < self.idle_time:
+            return
+        self._expired = now
+        self.buckets = {visitor: bucket for visitor, bucket in self.buckets.items() if now - bucket.updated < self.idle_time}
+
+    def allow_action(self, visitor: str) -> bool:
+        """Returns whether the visitor may wave, feed or take a photo now."""
+        with self.condition:
+            self._expire_buckets()
+            bucket = self.buckets.get(visitor)
+            if bucket is None:
+                bucket = self.buckets[visitor] = TokenBucket(self.action_rate, self.action_burst, self.clock)
+            return bucket.allow()
+
+    def retry_after(self, visitor: str) -> float:
+        """Returns the number of seconds until the visitor may act again."""
+        with self.condition:
+            bucket = self.buckets.get(visitor)
+            return 0.0 if bucket is None else bucket.retry_after()
@@ -0,0 +1,274 @@
+"""
+A small HTTP/JSON API over the Enclosure for signage and the mobile app.
+
+    python api.py enclosure.txt --port 8000
+
+GET  /primates                          every primate in the enclosure
+GET  /primates/<group>/<name>           one primate, including whether it is hungry
+GET  /groups                            the groups in the enclosure
+GET  /groups/<group>                    the names of the primates in a group
+GET  /cache                             hits, misses and evictions of the primate cache (null without one)
+GET  /species                           the facts about every species
+GET  /species/<group>                   the facts about one species
+POST /primates/<group>/<name>/wave
+POST /primates/<group>/<name>/feed      with a JSON body such as {"food": "banana"}
+POST /primates/<group>/<name>/photo
+
+Visitor actions are rate limited per client address with 429 responses, and each group has a
+limited number of places, answering 503 when the queue is full.
+
+Every GET response has an ETag. Roster responses are tagged with the enclosure version and a
+random tag for the server process, as the version starts again when the server restarts, so a
+client sending If-None-Match gets a bodyless 304 until the roster changes. Connections are kept
+alive, and response bodies are cached until the enclosure version changes.
+"""
+
+import argparse
+import hashlib
+import json
+import secrets
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+from admission import AdmissionController, EnclosureFull
+from primate_classes import Enclosure, Chimpanzee, Orangutan, Bonobo, Capuchin, Gorilla
+from storage import open_storage
+
+species = {
+    "chimpanzee": Chimpanzee,
+    "orangutan": Orangutan,
+    "bonobo": Bonobo,
+    "capuchin": Capuchin,
+    "gorilla": Gorilla,
+}
+
+
+def species_facts(group_class) -> dict:
+    """Returns the facts shown at the primate school for a species."""
+    return {
+        "group": group_class.__name__,
+        "scientific_name": group_class.scientific_name,
+        "population": group_class.population,
+        "endangered_level": group_class.endangered_level,
+        "habitat": group_class.habitat,
+        "fact": group_class.fact,
+        "easter_egg": group_class.easter_egg,
+    }
+
+
+def primate_summary(primate) -> dict:
+    return {
+        "group": primate.group,
+        "name": primate.name,
+        "age": int(primate.age),
+        "weight": int(primate.weight),
+        "description": primate.description,
+    }
+
+
+class ApiError(Exception):
+    """Raised by a route to send an error response."""
+
+    def __init__(self, status: int, message: str, headers: dict = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class EnclosureAPI():
+    """Answers API requests for an enclosure. Kept apart from the HTTP handler so it can be called directly."""
+
+    def __init__(self, enclosure: Enclosure, admission: AdmissionController = None):
+        self.enclosure = enclosure
+        # Visitor actions are limited per group and per visitor, waiting at most admission_timeout for a place
+        self.admission = admission or AdmissionController()
+        self.admission_timeout = 2.0
+        # Encoded bodies of roster responses, valid for a single enclosure version
+        self.cache = {}
+        self.cache_version = None
+        # Versions are counted from the load, so a restarted server would otherwise reuse old ETags
+        self.etag_prefix = secrets.token_hex(4)
+
+    def _primate(self, group: str, name: str):
+        if group not in species:
+            raise ApiError(404, "Unknown group.")
+        primate = self.enclosure.get_primate(group, name)
+        if primate is None:
+            raise ApiError(404, "Unknown primate.")
+        return primate
+
+    def get(self, parts: list) -> tuple:
+        """Returns the encoded body and ETag of a GET request."""
+        with self.enclosure.lock:
+            version = self.enclosure.version
+            if self.cache_version != version:
+                self.cache = {}
+                self.cache_version = version
+            key = "/".join(parts)
+            if key in self.cache:
+                return self.cache[key]
+
+            body, versioned = self._get(parts)
+            body = json.dumps(body).encode("UTF-8")
+            # A primate looked up on its own may have been restored, and nothing holds it once it is encoded
+            self.enclosure.trim_cache()
+            if versioned:
+                etag = f'"{self.etag_prefix}-v{version}"'
+            else:
+                etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            # Single primates change when they are fed, and cache statistics with every lookup,
+            # so they are tagged by their contents and not cached
+            if not (parts[0] == "primates" and len(parts) == 3) and parts != ["cache"]:
+                self.cache[key] = (body, etag)
+            return body, etag
+
+    def _get(self, parts: list) -> tuple:
+        """Returns the body of a GET request and whether it only changes with the enclosure version."""
+        if parts == ["primates"]:
+            return [primate_summary(primate) for primate in self.enclosure.enclosure_list], True
+        if parts[0] == "primates" and len(parts) == 3:
+            primate = self._primate(parts[1], parts[2])
+            return dict(primate_summary(primate), hungry=primate.hungry), False
+        if parts == ["groups"]:
+            return self.enclosure.get_groups_in_enclosure(), True
+        if parts[0] == "groups" and len(parts) == 2:
+            if parts[1] not in self.enclosure.get_groups_in_enclosure():
+                raise ApiError(404, "Unknown group.")
+            return self.enclosure.get_names_in_group(parts[1]), True
+        if parts == ["cache"]:
+            return self.enclosure.cache_stats(), False
+        if parts == ["species"]:
+            return [species_facts(group_class) for group_class in species.values()], False
+        if parts[0] == "species" and len(parts) == 2:
+            if parts[1] not in species:
+                raise ApiError(404, "Unknown group.")
+            return species_facts(species[parts[1]]), False
+        raise ApiError(404, "Not found.")
+
+    def post(self, parts: list, body: dict, visitor: str) -> bytes:
+        """Performs a visitor action and returns the encoded response."""
+        if parts[0] != "primates" or len(parts) != 4:
+            raise ApiError(404, "Not found.")
+        if parts[1] not in species:
+            raise ApiError(404, "Unknown group.")
+        if not self.admission.allow_action(visitor):
+            retry = self.admission.retry_after(visitor)
+            raise ApiError(429, "Too many actions, please slow down.", {"Retry-After": str(max(1, round(retry)))})
+        try:
+            with self.admission.visit(parts[1], self.admission_timeout):
+                return self._act(parts, body)
+        except EnclosureFull as error:
+            raise ApiError(503, str(error), {"Retry-After": str(max(1, round(error.wait)))})
+
+    def _act(self, parts: list, body: dict) -> bytes:
+        if parts[3] not in ["wave", "feed", "photo"]:
+            raise ApiError(404, "Unknown action.")
+        if parts[3] == "wave":
+            with self.enclosure.lock:
+                primate = self._primate(parts[1], parts[2])
+            # A wave doesn't change the primate, so it runs outside the lock, as a gorilla's wave blocks while its sound plays
+            message = primate.wave()
+        else:
+            food = body.get("food")
+            if parts[3] == "feed" and food not in ["apple", "banana", "cucumber", "date"]:
+                raise ApiError(400, "The food must be an apple, banana, cucumber or date.")
+            # Feeding and taking a photo change the primate, so they run under the lock, where it can't be spilled
+            with self.enclosure.lock:
+                primate = self._primate(parts[1], parts[2])
+                if parts[3] == "feed":
+                    message = primate.feed_primate(food)
+                else:
+                    message = primate.take_photo()
+        self.enclosure.trim_cache()
+        return json.dumps({"message": message}).encode("UTF-8")
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """Handles HTTP requests for the EnclosureAPI set on the server."""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in one packet, which matters for keep-alive connections
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def _parts(self) -> list:
+        path = self.path.split("?", 1)[0]
+        return [unquote(part).lower() for part in path.split("/") if part] or [""]
+
+    def _send(self, status: int, body: bytes = b"", etag: str = None, headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def _send_error(self, error: ApiError):
+        self._send(error.status, json.dumps({"error": str(error)}).encode("UTF-8"), headers=error.headers)
+
+    def do_GET(self):
+        try:
+            body, etag = self.server.api.get(self._parts())
+        except ApiError as error:
+            self._send_error(error)
+            return
+        if etag in [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]:
+            self._send(304, etag=etag)
+        else:
+            self._send(200, body, etag)
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if length < 0:
+                raise ValueError
+        except ValueError:
+            # The body can't be skipped without its length, so the connection can't be reused
+            self.close_connection = True
+            self._send_error(ApiError(400, "The Content-Length header must be a number of bytes."))
+            return
+        try:
+            data = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(data, dict):
+                raise ValueError
+        except ValueError:
+            self._send_error(ApiError(400, "The body must be a JSON object."))
+            return
+        try:
+            # Keyed on the address rather than a header the client could change for every request
+            body = self.server.api.post(self._parts(), data, self.client_address[0])
+        except ApiError as error:
+            self._send_error(error)
+            return
+        self._send(200, body)
+
+    def log_message(self, format, *args):
+        """Requests aren't logged, writing to stderr for each one would slow the server down."""
+
+
+def create_server(enclosure: Enclosure, host: str = "127.0.0.1", port: int = 8000) -> ThreadingHTTPServer:
+    """Returns an HTTP server for the enclosure, ready to serve_forever()."""
+    server = ThreadingHTTPServer((host, port), RequestHandler)
+    server.daemon_threads = True
+    server.api = EnclosureAPI(enclosure)
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Primate Paradise HTTP API")
+    parser.add_argument("roster", nargs="?", default="enclosure.txt")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--cache-size", type=int, help="keep only this many recently used primates in memory as live objects")
+    args = parser.parse_args()
+
+    enclosure = Enclosure(open_storage(args.roster), cache_size=args.cache_size)
+    enclosure.load_members()
+    server = create_server(enclosure, args.host, args.port)
+    print(f"Serving the enclosure on http://{args.host}:{args.port}")
+    server.serve_forever()
@@ -0,0 +1,181 @@
+"""
+Contains the cache that bounds how many primates an Enclosure keeps as live objects.
+
+The primates used most recently stay live and the rest are spilled: each one is replaced in its
+group list by a SpilledPrimate that keeps the group, name, age, weight and hunger and holds the
+rest of the primate compressed. Tables, indexes and searches only need those fields,
+so they work on spilled primates as they are. Enclosure.get_primate() and every edit turn a
+spilled primate back into a live one.
+
+Spilling takes one pass over the roster, so it waits until the cache has gone over its size by a
+quarter and then spills back down to the size. A primate spilled while someone still holds it would
+lose the changes made to it afterwards, so spilling only happens when nothing does: after a commit and
+when Enclosure.trim_cache() is called, e.g. once a visitor leaves a primate or an API request is answered. While the roster loads, the primates that come after
+the first size are spilled as they are read instead, so loading never holds the whole roster live.
+
+When the storage can read a single row (a block file, see storage.py) and a primate is spilled while
+storage holds it as it is, the spilled primate keeps nothing compressed: its description is read
+back from its one block of storage when it is restored.
+"""
+
+import marshal
+import zlib
+from collections import OrderedDict
+
+# Raw deflate with a small window, as a primate is only a few hundred bytes and a full zlib stream
+# spends more time setting up its buffers than compressing
+window_bits = -12
+memory_level = 2
+
+
+class SpilledPrimate():
+    """
+    A primate evicted from the cache. Any attribute other than the ones kept is read from a
+    restored copy, so a spilled primate can be read but must be restored before it is changed.
+    """
+
+    __slots__ = ("kind", "group", "name", "age", "weight", "hungry", "data", "storage")
+    kept = ("group", "name", "age", "weight", "hungry")
+
+    def __init__(self, primate, storage=None):
+        """Spills a primate. Given a keyed storage that holds the primate as it is, the rest is left in storage."""
+        self.kind = type(primate)
+        self.group = primate.group
+        self.name = primate.name
+        self.age = primate.age
+        self.weight = primate.weight
+        self.hungry = primate.hungry
+        # The description and any state of the species, such as an orangutan's camera
+        rest = {key: value for key, value in vars(primate).items() if key not in self.kept}
+        # State that storage doesn't hold, such as a camera an orangutan grabbed, has to be kept here
+        if storage is not None and rest == self._stored(primate):
+            self.storage = storage
+            self.data = None
+        else:
+            self.storage = None
+            compressor = zlib.compressobj(6, zlib.DEFLATED, window_bits, memory_level)
+            self.data = compressor.compress(marshal.dumps(rest)) + compressor.flush()
+
+    def _stored(self, primate) -> dict:
+        """Returns the state besides the kept fields that a primate read back from storage would have."""
+        fresh = self.kind(primate.name, primate.age, primate.weight, primate.description, hungry=primate.hungry)
+        return {key: value for key, value in vars(fresh).items() if key not in self.kept}
+
+    def restore(self) -> object:
+        """Returns the primate as a live object."""
+        if self.data is None:
+            row = self.storage.get(self.group, self.name)
+            if row is None:
+                raise Exception(f"{self.name} is no longer in storage.")
+            return self.kind(self.name, self.age, self.weight, row[4], hungry=self.hungry)
+        primate = self.kind.__new__(self.kind)
+        for key in self.kept:
+            setattr(primate, key, getattr(self, key))
+        primate.__dict__.update(marshal.loads(zlib.decompress(self.data, window_bits)))
+        return primate
+
+    def __getattr__(self, attribute):
+        return getattr(self.restore(), attribute)
+
+
+class PrimateCache():
+    """Keeps up to size primates of an enclosure live, most recently used first to stay."""
+
+    def __init__(self, enclosure, size: int):
+        if size < 1:
+            raise Exception("The cache must hold at least one primate.")
+        self.enclosure = enclosure
+        self.size = size
+        self.slack = max(size // 4, 16)
+        # Live primates by id, least recently used first
+        self.live = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def touch(self, primate):
+        """Records a use of a live primate."""
+        self.live[id(primate)] = primate
+        self.live.move_to_end(id(primate))
+
+    def _storage(self, synced: bool):
+        """Returns the storage spilled primates can be read back from, or None if they must keep their state."""
+        storage = self.enclosure.storage
+        if synced and storage is not None and storage.keyed:
+            return storage
+        return None
+
+    def admit(self, primate) -> object:
+        """Returns a newly loaded primate as it should be stored: live while the cache has room, otherwise spilled."""
+        if len(self.live) < self.size:
+            self.touch(primate)
+            return primate
+        self.evictions += 1
+        # The primate was just read from storage, so storage holds it as it is
+        return SpilledPrimate(primate, self._storage(True))
+
+    def _relist(self, members: list, position: int, spilled: SpilledPrimate, member):
+        """Puts a restored primate in the enclosure list in place of its spilled form."""
+        enclosure = self.enclosure
+        # The enclosure list holds the group lists one after another
+        offset = position
+        for group in enclosure.groups:
+            group_members = getattr(enclosure, f"{group}_list")
+            if group_members is members:
+                break
+            offset += len(group_members)
+        if offset < len(enclosure.enclosure_list) and enclosure.enclosure_list[offset] is spilled:
+            enclosure.enclosure_list[offset] = member
+        else:
+            # The group lists have changed since the enclosure list was made, so it is made again
+            enclosure.update_enclosure_list()
+
+    def materialise(self, members: list, position: int) -> object:
+        """Returns the primate at a position of a group list, restoring it in place if it was spilled."""
+        member = members[position]
+        if isinstance(member, SpilledPrimate):
+            self.misses += 1
+            spilled = member
+            member = members[position] = spilled.restore()
+            self._relist(members, position, spilled, member)
+        else:
+            self.hits += 1
+        self.touch(member)
+        return member
+
+    def evict(self, force: bool = False, synced: bool = False):
+        """
+        Spills the least recently used primates until no more than size are live. synced says that
+        storage holds every primate as it is in memory, such as straight after a save.
+        """
+        if len(self.live) <= self.size + (0 if force else self.slack):
+            return
+        while len(self.live) > self.size:
+            self.live.popitem(last=False)
+        present = set()
+        storage = self._storage(synced)
+        for group in self.enclosure.groups:
+            members = getattr(self.enclosure, f"{group}_list")
+            for i, member in enumerate(members):
+                if isinstance(member, SpilledPrimate):
+                    continue
+                if id(member) in self.live:
+                    present.add(id(member))
+                else:
+                    members[i] = SpilledPrimate(member, storage)
+                    self.evictions += 1
+        # Primates removed or replaced by a copy since they were used are dropped too
+        self.live = OrderedDict((key, primate) for key, primate in self.live.items() if key in present)
+        self.enclosure.update_enclosure_list()
+
+    def stats(self) -> dict:
+        """Returns the hits, misses and evictions so far, and the number of live and spilled primates."""
+        spilled = sum(1 for primate in self.enclosure.enclosure_list if isinstance(primate, SpilledPrimate))
+        return {
+            "size": self.size,
+            "live": len(self.enclosure.enclosure_list) - spilled,
+            "spilled": spilled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
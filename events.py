@@ -0,0 +1,82 @@
+"""
+Contains the change events the Enclosure publishes to its subscribers.
+
+An event has a kind of "added", "removed", "changed" or "reset". Added events carry the new primate
+as their new value and removed events the old primate as their old value. Changed events name the
+field that changed ("name", "age", "weight", "description" or "hungry") with its old and new values.
+A reset means the whole roster was replaced (loaded, rolled back or undone) and should be read again.
+"""
+
+from collections import namedtuple
+
+ChangeEvent = namedtuple("ChangeEvent", ["kind", "group", "name", "field", "old", "new"])
+
+
+class Subscription():
+    """
+    A subscriber to an Enclosure. The callback gets each event as it happens or, for a batch
+    subscription, a coalesced list of events whenever the enclosure flushes its events.
+    """
+
+    def __init__(self, callback, batch: bool = False):
+        self.callback = callback
+        self.batch = batch
+        self.pending = []
+
+    def deliver(self, event: ChangeEvent):
+        if self.batch:
+            self.pending.append(event)
+        else:
+            self.callback(event)
+
+    def flush(self):
+        """Delivers the pending events of a batch subscription."""
+        if self.pending:
+            events = coalesce(self.pending)
+            self.pending = []
+            if events:
+                self.callback(events)
+
+
+def coalesce(events: list) -> list:
+    """
+    Returns a shorter list of events with the same overall effect: repeated changes to a field
+    become one, adding then removing a primate cancels out and a reset drops everything before it.
+    """
+    result = []
+    added = {}
+    changed = {}
+    for event in events:
+        if event.kind == "reset":
+            result, added, changed = [event], {}, {}
+            continue
+
+        key = (event.group.lower(), event.name.lower())
+        if event.kind == "added":
+            added[key] = len(result)
+            result.append(event)
+        elif event.kind == "removed":
+            # Subscribers still know a renamed primate by the name it had before this batch
+            if (key, "name") in changed:
+                event = event._replace(name=result[changed[(key, "name")]].old)
+            for field_key in [field_key for field_key in changed if field_key[0] == key]:
+                result[changed.pop(field_key)] = None
+            if key in added:
+                result[added.pop(key)] = None
+            else:
+                result.append(event)
+        else:
+            if (key, event.field) in changed:
+                index = changed[(key, event.field)]
+                result[index] = result[index]._replace(new=event.new)
+            else:
+                changed[(key, event.field)] = len(result)
+                result.append(event)
+            if event.field == "name":
+                new_key = (key[0], event.new.lower())
+                for field_key in [field_key for field_key in changed if field_key[0] == key]:
+                    changed[(new_key, field_key[1])] = changed.pop(field_key)
+                if key in added:
+                    added[new_key] = added.pop(key)
+
+    return [event for event in result if event is not None and not (event.kind == "changed" and event.old == event.new)]
@@ -0,0 +1,163 @@
+"""
+Combines the rosters of several zoo sites into one read-only Enclosure.
+
+Each roster file is read in its own worker process, which also builds the primates and tags each
+of them with the site it came from. The sites are then added together as one change, so the
+indexes of the enclosure are rebuilt once rather than once per site.
+
+Directories are searched for roster files of any storage backend (.txt, .db, .pack, ...), and a
+file called enclosure.txt (or .db) is named after the directory it is in. A file that turns out not
+to be a roster, such as notes or a saved zoo_photo.txt, is skipped with a warning.
+
+    python federation.py north/ south/enclosure.txt east.db
+"""
+
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from tabulate import tabulate
+from primate_classes import Enclosure, create_primate
+from storage import open_storage
+from watcher import valid_rows
+
+roster_extensions = (".txt", ".db", ".sqlite", ".sqlite3", ".pack", ".xpack")
+
+
+def find_rosters(paths: list) -> list:
+    """Returns the roster files in the given files and directories."""
+    rosters = []
+    for path in paths:
+        if os.path.isdir(path):
+            rosters += sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(roster_extensions))
+        else:
+            rosters.append(path)
+    return rosters
+
+
+def site_name(path: str) -> str:
+    """Returns the site name for a roster file."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    if name == "enclosure":
+        return os.path.basename(os.path.dirname(os.path.abspath(path)))
+    return name
+
+
+def load_site(path: str) -> tuple:
+    """
+    Reads a roster file and returns the site name with a primate for each row. Raises an Exception
+    if the file isn't a roster. Runs in a worker process.
+    """
+    site = site_name(path)
+    try:
+        rows = open_storage(path).load()
+    except (OSError, ValueError, UnicodeDecodeError):
+        rows = None
+    if rows is None or not valid_rows(rows):
+        raise Exception(f"{path} is not a roster file.")
+    members = []
+    for group, name, age, weight, description, hungry in rows:
+        member = create_primate(group, name, age, weight, description, str(hungry) != "False")
+        if member is not None:
+            member.site = site
+            members.append(member)
+    return site, members
+
+
+class FederatedEnclosure(Enclosure):
+    """
+    A read-only Enclosure holding the members of many sites. Every member has a site attribute,
+    and the tables and names work over all the sites together.
+    """
+
+    def __init__(self):
+        super().__init__(storage=None)
+        self.sites = []
+
+    def add_sites(self, sites):
+        """
+        Adds the members of many sites, given as (site name, primates) pairs from load_site(), as
+        one change that publishes a single reset.
+        """
+        for site, members in sites:
+            for member in members:
+                getattr(self, f"{member.group.lower()}_list").append(member)
+            self.sites.append(site)
+        self.version += 1
+        self.update_enclosure_list()
+        self._publish("reset", "", "")
+        self.flush_events()
+
+    def add_site(self, site: str, rows: list):
+        """Adds the members of a site from its storage rows, tagging each of them with the site name."""
+        members = []
+        for group, name, age, weight, description, hungry in rows:
+            member = create_primate(group, name, age, weight, description, str(hungry) != "False")
+            if member is not None:
+                member.site = site
+                members.append(member)
+        self.add_sites([(site, members)])
+
+    def load_sites(self, paths: list, workers: int = None) -> list:
+        """
+        Loads every roster in the given files and directories in parallel. Returns a message for
+        each file that was skipped because it isn't a roster.
+        """
+        sites = []
+        skipped = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for future in [executor.submit(load_site, path) for path in find_rosters(paths)]:
+                try:
+                    sites.append(future.result())
+                except Exception as error:
+                    skipped.append(str(error))
+        self.add_sites(sites)
+        return skipped
+
+    def __str__(self):
+        """Returns all the members of every site, in a table format."""
+        header = ["Site", "Group", "Name"]
+        data = [[primate.site, primate.group, primate.name] for primate in self.enclosure_list]
+        return tabulate(data, header, tablefmt="rounded_grid")
+
+    def get_primate(self, group: str, name: str, site: str = None) -> object:
+        """Returns the primate object given the group name, primate name and optionally the site."""
+        if group not in self.groups:
+            raise Exception("Invalid group type selected.")
+        for primate in getattr(self, f"{group}_list"):
+            if primate.name.lower() == name and (site is None or primate.site == site):
+                return primate
+
+    def get_sites_with(self, group: str) -> list:
+        """Returns the sites that have at least one member of the given group."""
+        return sorted({primate.site for primate in self.enclosure_list if primate.group.lower() == group})
+
+    def summary(self) -> str:
+        """Returns the number of primates and their average age and weight per site and group, in a table format."""
+        totals = {}
+        for primate in self.enclosure_list:
+            count, age, weight = totals.get((primate.site, primate.group), (0, 0, 0))
+            totals[(primate.site, primate.group)] = (count + 1, age + int(primate.age), weight + int(primate.weight))
+
+        header = ["Site", "Group", "Primates", "Average age", "Average weight (kg)"]
+        data = []
+        for (site, group), (count, age, weight) in sorted(totals.items()):
+            data.append([site, group, count, round(age / count, 1), round(weight / count, 1)])
+        return tabulate(data, header, tablefmt="rounded_grid")
+
+    def _read_only(self, *args, **kwargs):
+        raise Exception("A federated enclosure is read-only.")
+
+    add_primate = remove_primate = set_name = set_age = set_weight = set_desc = _read_only
+    begin = commit = rollback = undo = save_members = feed_primates = merge_rows = _read_only
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python federation.py <roster file or directory> ...")
+        sys.exit(1)
+    federation = FederatedEnclosure()
+    for warning in federation.load_sites(sys.argv[1:]):
+        print(f"Warning: {warning} It was skipped.")
+    print(federation)
+    print(federation.summary())
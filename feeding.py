@@ -0,0 +1,155 @@
+"""
+Plans a feeding round for the whole roster from the hunger of each primate and the food in stock.
+
+Every hungry primate is offered one item of food it will eat: capuchins only eat dates, an orangutan
+holding a camera wants a banana before it gives the camera back, and every other primate eats
+anything on the food menu. Food a primate would throw back, or food for a primate that isn't hungry,
+is never handed out. The picky primates are served first, then the others are fed from the foods the
+picky ones don't need, so dates and bananas are kept for the animals that only eat them.
+
+Primates get hungry again every day: before the first round of a new day is planned, every primate
+that was fed is made hungry again, as one transaction.
+
+The plan takes one pass over the roster and is applied as one transaction with a single save.
+The food stock is kept in a JSON file with the counts by food and the day of the last round, e.g.
+{"stock": {"apple": 40, "date": 12}, "last_round": "2026-10-19"}. A file of counts alone is read too.
+"""
+
+import datetime
+import json
+import os
+
+from tabulate import tabulate
+
+from menu_options import food as food_menu
+
+# The foods on the food menu, e.g. "b - Banana" gives "banana"
+foods = [line.split(" - ")[1].lower() for line in food_menu.splitlines() if " - " in line and not line.startswith("0")]
+# Where the stock is kept and what day it is, replaced by replay.py so a session replays against its own stock and day
+stock_path = "food_stock.json"
+clock = datetime.date.today
+
+
+def _read(path: str) -> dict:
+    if not os.path.exists(path):
+        return {"stock": {}, "last_round": None}
+    with open(path, "r", encoding="UTF-8") as file:
+        data = json.load(file)
+    if "stock" not in data:
+        data = {"stock": data, "last_round": None}
+    return data
+
+
+def load_stock(path: str = None) -> dict:
+    """Returns the number of items of each food in stock."""
+    stock = {food: 0 for food in foods}
+    stock.update(_read(path or stock_path)["stock"])
+    return stock
+
+
+def last_round(path: str = None) -> str:
+    """Returns the day of the last feeding round as YYYY-MM-DD, or None if there hasn't been one."""
+    return _read(path or stock_path).get("last_round")
+
+
+def save_stock(stock: dict, path: str = None, day: str = None):
+    """Writes the stock, and the day of the last round if given, keeping the day already saved otherwise."""
+    path = path or stock_path
+    data = {"stock": stock, "last_round": day or last_round(path)}
+    with open(path, "w", encoding="UTF-8") as file:
+        json.dump(data, file, indent=4)
+
+
+def today() -> str:
+    return clock().isoformat()
+
+
+def accepted_foods(primate) -> list:
+    """Returns the foods that will feed a primate, as its feed_primate() method decides."""
+    if primate.group == "Capuchin":
+        return ["date"]
+    elif primate.group == "Orangutan" and primate.has_camera:
+        return ["banana"]
+    else:
+        return foods
+
+
+class FeedingPlan():
+    """A feeding round: the food for each primate, the hungry primates left unfed and the stock left over."""
+
+    def __init__(self, meals: list, unfed: list, leftover: dict):
+        self.meals = meals
+        self.unfed = unfed
+        self.leftover = leftover
+
+    def portions(self) -> dict:
+        """Returns the number of items of each food the round uses."""
+        used = {food: 0 for food in self.leftover}
+        for _, _, food in self.meals:
+            used[food] += 1
+        return used
+
+    def __str__(self):
+        """Returns the food the round uses and the stock left over, in a table format."""
+        header = ["Food", "Portions", "Left in stock"]
+        used = self.portions()
+        data = [[food.capitalize(), used[food], self.leftover[food]] for food in self.leftover]
+        return tabulate(data, header, tablefmt="rounded_grid")
+
+
+def plan_feeding(primates: list, stock: dict) -> FeedingPlan:
+    """Returns a FeedingPlan that feeds as many hungry primates as the stock allows."""
+    left = dict(stock)
+    meals = []
+    unfed = []
+    # Picky primates by the one food they accept, and the primates that eat anything
+    picky = {}
+    flexible = []
+    for primate in primates:
+        if not primate.hungry:
+            continue
+        accepted = accepted_foods(primate)
+        if len(accepted) == 1:
+            picky.setdefault(accepted[0], []).append(primate)
+        else:
+            flexible.append(primate)
+
+    for food, waiting in picky.items():
+        served = min(len(waiting), max(left.get(food, 0), 0))
+        meals += [[primate.group.lower(), primate.name.lower(), food] for primate in waiting[:served]]
+        unfed += waiting[served:]
+        left[food] = left.get(food, 0) - served
+
+    # Foods no picky primate needs go first, then the most plentiful
+    order = sorted(foods, key=lambda food: (food in picky, -left.get(food, 0)))
+    position = 0
+    for food in order:
+        served = min(len(flexible) - position, max(left.get(food, 0), 0))
+        meals += [[primate.group.lower(), primate.name.lower(), food] for primate in flexible[position:position + served]]
+        left[food] = left.get(food, 0) - served
+        position += served
+    unfed += flexible[position:]
+
+    return FeedingPlan(meals, unfed, left)
+
+
+def start_day(enclosure, path: str = None) -> bool:
+    """
+    Makes the primates hungry again if the last round was on an earlier day, as one transaction.
+    Returns whether a new day was started.
+    """
+    if last_round(path) == today():
+        return False
+    with enclosure.transaction():
+        enclosure.reset_hunger()
+    save_stock(load_stock(path), path, today())
+    return True
+
+
+def apply_plan(enclosure, plan: FeedingPlan, path: str = None) -> list:
+    """Feeds the primates in the plan as one transaction, updates the stock and returns the primates' responses."""
+    with enclosure.transaction():
+        responses = enclosure.feed_primates(plan.meals)
+    save_stock(plan.leftover, path, today())
+    return responses
+
@@ -0,0 +1,315 @@
+"""
+Models the physical layout of a zoo: a site has habitats, a habitat has enclosures and an enclosure
+holds primates, up to a number of animals and a total weight.
+
+Each habitat lists the species it suits. A habitat that doesn't list them suits every species
+whose habitat attribute mentions it, so a "Rainforest" habitat takes bonobos, capuchins, gorillas
+and orangutans. New primates are placed best-fit: into the suitable
+enclosure with the least weight capacity left that still fits them, which keeps large enclosures
+free for large animals. Batches are placed heaviest first. Each habitat keeps its enclosures with
+room sorted by the weight capacity they have left, so each placement is a binary search in every
+habitat that suits the species.
+
+Placements are kept next to the layout (site.placements.json for site.json) and saved whenever the
+roster is, so animals stay in their enclosures from one run to the next. Only animals without a
+place are placed when the roster is loaded again, and an animal that grows too heavy for its
+enclosure moves to one with room, or is left without a place if there isn't one.
+
+A layout is a JSON file such as:
+    {"name": "Primate Paradise", "habitats": [
+        {"name": "Rainforest", "species": ["Bonobo", "Gorilla"],
+         "enclosures": [{"id": "RF-1", "max_primates": 6, "max_weight": 600}]}]}
+
+    python habitats.py site.json enclosure.txt
+"""
+
+import bisect
+import json
+import os
+import sys
+
+from tabulate import tabulate
+
+from primate_classes import Enclosure, Chimpanzee, Orangutan, Bonobo, Capuchin, Gorilla
+
+species_classes = [Chimpanzee, Orangutan, Bonobo, Capuchin, Gorilla]
+
+
+class PhysicalEnclosure():
+    """An enclosure on the site, with room for max_primates animals weighing up to max_weight kg together."""
+
+    def __init__(self, enclosure_id: str, habitat, max_primates: int, max_weight: int):
+        self.enclosure_id = enclosure_id
+        self.habitat = habitat
+        self.max_primates = max_primates
+        self.max_weight = max_weight
+        # Weight of each primate by (group, name)
+        self.members = {}
+        self.weight = 0
+
+    @property
+    def free_weight(self) -> int:
+        return self.max_weight - self.weight
+
+    def fits(self, weight: int) -> bool:
+        return len(self.members) < self.max_primates and weight <= self.free_weight
+
+
+def suited_species(habitat_name: str) -> list:
+    """Returns the species whose habitat attribute mentions the habitat, ignoring spaces."""
+    wanted = habitat_name.lower().replace(" ", "")
+    return [species.__name__.lower() for species in species_classes if wanted in species.habitat.lower().replace(" ", "")]
+
+
+class Habitat():
+    """A group of enclosures suited to the same species."""
+
+    def __init__(self, name: str, species: list = None):
+        self.name = name
+        if species is None:
+            species = suited_species(name)
+        self.species = [group.lower() for group in species]
+        self.enclosures = []
+        # [free weight, enclosure id] of the enclosures with room, sorted
+        self.free = []
+
+
+class Site():
+    """A zoo site with its habitats, and an index from each primate to the enclosure it lives in."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.habitats = []
+        self.locations = {}
+        self.enclosure = None
+        # Where the placements are saved, or None to keep them in memory only
+        self.placements_path = None
+        # The habitats that suit each species
+        self._suited = {}
+        self._enclosures = {}
+        # Whether the placements changed since they were saved
+        self._changed = False
+
+    @classmethod
+    def from_config(cls, config: dict) -> "Site":
+        """Returns a site built from a layout (see the module docstring)."""
+        site = cls(config.get("name", "Primate Paradise"))
+        for habitat_config in config["habitats"]:
+            habitat = Habitat(habitat_config["name"], habitat_config.get("species"))
+            for enclosure_config in habitat_config["enclosures"]:
+                enclosure = PhysicalEnclosure(enclosure_config["id"], habitat, enclosure_config["max_primates"], enclosure_config["max_weight"])
+                if enclosure.enclosure_id in site._enclosures:
+                    raise Exception(f"There is more than one enclosure called {enclosure.enclosure_id}.")
+                habitat.enclosures.append(enclosure)
+                site._enclosures[enclosure.enclosure_id] = enclosure
+            for group in habitat.species:
+                site._suited.setdefault(group, []).append(habitat)
+            site.habitats.append(habitat)
+        site.clear()
+        return site
+
+    @classmethod
+    def load(cls, path: str) -> "Site":
+        """Returns the site laid out in a file, saving its placements next to it."""
+        with open(path, "r", encoding="UTF-8") as file:
+            site = cls.from_config(json.load(file))
+        site.placements_path = os.path.splitext(path)[0] + ".placements.json"
+        return site
+
+    def load_placements(self) -> dict:
+        """Returns the saved enclosure id of each primate by (group, name), or an empty dict."""
+        if self.placements_path is None or not os.path.exists(self.placements_path):
+            return {}
+        with open(self.placements_path, "r", encoding="UTF-8") as file:
+            saved = json.load(file)
+        return {(group, name): enclosure_id for group, names in saved.items() for name, enclosure_id in names.items()}
+
+    def save_placements(self):
+        """Writes the enclosure of every placed primate, as {group: {name: enclosure id}}."""
+        if self.placements_path is None:
+            return
+        saved = {}
+        for (group, name), enclosure in sorted(self.locations.items()):
+            saved.setdefault(group, {})[name] = enclosure.enclosure_id
+        temporary = self.placements_path + ".tmp"
+        with open(temporary, "w", encoding="UTF-8") as file:
+            json.dump(saved, file, indent=4)
+        os.replace(temporary, self.placements_path)
+        self._changed = False
+
+    def clear(self):
+        """Empties every enclosure on the site."""
+        self.locations = {}
+        for habitat in self.habitats:
+            for enclosure in habitat.enclosures:
+                enclosure.members = {}
+                enclosure.weight = 0
+            habitat.free = sorted([enclosure.free_weight, enclosure.enclosure_id] for enclosure in habitat.enclosures)
+
+    def _update_free(self, enclosure: PhysicalEnclosure, old_free: int):
+        """Moves an enclosure to its new place in the free capacity list of its habitat."""
+        free = enclosure.habitat.free
+        position = bisect.bisect_left(free, [old_free, enclosure.enclosure_id])
+        if position < len(free) and free[position][1] == enclosure.enclosure_id:
+            del free[position]
+        if len(enclosure.members) < enclosure.max_primates:
+            bisect.insort(free, [enclosure.free_weight, enclosure.enclosure_id])
+
+    def find_enclosure(self, group: str, weight: int) -> PhysicalEnclosure:
+        """Returns the best-fitting enclosure with room for a primate, or None if there isn't one."""
+        best = None
+        for habitat in self._suited.get(group.lower(), []):
+            position = bisect.bisect_left(habitat.free, [weight, ""])
+            if position < len(habitat.free) and (best is None or habitat.free[position] < best):
+                best = habitat.free[position]
+        if best is None:
+            return None
+        return self._enclosures[best[1]]
+
+    def _assign(self, key: tuple, weight: int, enclosure: PhysicalEnclosure):
+        old_free = enclosure.free_weight
+        enclosure.members[key] = weight
+        enclosure.weight += weight
+        self.locations[key] = enclosure
+        self._update_free(enclosure, old_free)
+        self._changed = True
+
+    def place(self, primate) -> PhysicalEnclosure:
+        """Places a primate in an enclosure and returns it. Raises an Exception if no suitable enclosure has room."""
+        key = (primate.group.lower(), primate.name.lower())
+        if key in self.locations:
+            return self.locations[key]
+        weight = int(primate.weight)
+        enclosure = self.find_enclosure(primate.group, weight)
+        if enclosure is None:
+            raise Exception(f"No {primate.group} enclosure has room for {primate.name}.")
+        self._assign(key, weight, enclosure)
+        return enclosure
+
+    def place_all(self, primates: list) -> list:
+        """Places a batch of primates, heaviest first, and returns the ones that didn't fit."""
+        unplaced = []
+        for primate in sorted(primates, key=lambda primate: int(primate.weight), reverse=True):
+            try:
+                self.place(primate)
+            except Exception:
+                unplaced.append(primate)
+        return unplaced
+
+    def remove(self, group: str, name: str):
+        """Frees the place of a primate that has left."""
+        key = (group.lower(), name.lower())
+        enclosure = self.locations.pop(key, None)
+        if enclosure is not None:
+            old_free = enclosure.free_weight
+            enclosure.weight -= enclosure.members.pop(key)
+            self._update_free(enclosure, old_free)
+            self._changed = True
+
+    def reweigh(self, group: str, name: str, weight: int):
+        """
+        Updates the weight of a placed primate. If its enclosure can't hold the new weight, it moves
+        to the best-fitting enclosure that can, or is left without a place if none can.
+        """
+        key = (group.lower(), name.lower())
+        enclosure = self.locations.get(key)
+        if enclosure is None or enclosure.members[key] == weight:
+            return
+        if weight - enclosure.members[key] <= enclosure.free_weight:
+            old_free = enclosure.free_weight
+            enclosure.weight += weight - enclosure.members[key]
+            enclosure.members[key] = weight
+            self._update_free(enclosure, old_free)
+            self._changed = True
+        else:
+            self.remove(group, name)
+            new_enclosure = self.find_enclosure(group, weight)
+            if new_enclosure is not None:
+                self._assign(key, weight, new_enclosure)
+
+    def can_hold(self, group: str, name: str, weight: int) -> bool:
+        """Returns whether a primate could weigh weight kg, staying in its enclosure or moving to one with room."""
+        key = (group.lower(), name.lower())
+        enclosure = self.locations.get(key)
+        if enclosure is not None and weight - enclosure.members[key] <= enclosure.free_weight:
+            return True
+        return self.find_enclosure(group, weight) is not None
+
+    def location_of(self, group: str, name: str) -> PhysicalEnclosure:
+        """Returns the enclosure a primate lives in, or None."""
+        return self.locations.get((group.lower(), name.lower()))
+
+    def handle(self, event):
+        """Keeps the placements in line with an Enclosure's change events."""
+        if event.kind == "reset":
+            # Animals keep their places, so only the ones that left, changed weight or are new are moved
+            roster = {(primate.group.lower(), primate.name.lower()): primate for primate in self.enclosure.enclosure_list}
+            for key in [key for key in self.locations if key not in roster]:
+                self.remove(key[0], key[1])
+            for key, primate in roster.items():
+                self.reweigh(key[0], key[1], int(primate.weight))
+            self.place_all([primate for key, primate in roster.items() if key not in self.locations])
+        elif event.kind == "added":
+            self.place_all([event.new])
+        elif event.kind == "removed":
+            self.remove(event.group, event.name)
+        elif event.kind == "changed" and event.field == "name":
+            enclosure = self.locations.pop((event.group.lower(), event.old.lower()), None)
+            if enclosure is not None:
+                new_key = (event.group.lower(), event.new.lower())
+                enclosure.members[new_key] = enclosure.members.pop((event.group.lower(), event.old.lower()))
+                self.locations[new_key] = enclosure
+                self._changed = True
+        elif event.kind == "changed" and event.field == "weight":
+            self.reweigh(event.group, event.name, int(event.new))
+
+    def _saved(self, events: list):
+        if self._changed:
+            self.save_placements()
+
+    def attach(self, enclosure) -> list:
+        """
+        Puts every primate in the enclosure back in its saved place, places the others and follows
+        the enclosure's changes. Returns the primates that didn't fit.
+        """
+        self.enclosure = enclosure
+        saved = self.load_placements()
+        unplaced = []
+        for primate in enclosure.enclosure_list:
+            key = (primate.group.lower(), primate.name.lower())
+            placed = self._enclosures.get(saved.get(key))
+            # The layout may have changed since, so the saved place must still hold the primate
+            if placed is not None and primate.group.lower() in placed.habitat.species and placed.fits(int(primate.weight)):
+                self._assign(key, int(primate.weight), placed)
+            else:
+                unplaced.append(primate)
+        unplaced = self.place_all(unplaced)
+        enclosure.subscribe(self.handle)
+        enclosure.subscribe(self._saved, batch=True)
+        if self._changed:
+            self.save_placements()
+        return unplaced
+
+    def __str__(self):
+        """Returns the occupancy of every enclosure on the site, in a table format."""
+        header = ["Habitat", "Enclosure", "Primates", "Weight (kg)"]
+        data = []
+        for habitat in self.habitats:
+            for enclosure in habitat.enclosures:
+                data.append([habitat.name, enclosure.enclosure_id, f"{len(enclosure.members)}/{enclosure.max_primates}", f"{enclosure.weight}/{enclosure.max_weight}"])
+        return tabulate(data, header, tablefmt="rounded_grid")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python habitats.py <site layout> <roster>")
+        sys.exit(1)
+    from storage import open_storage
+
+    roster = Enclosure(open_storage(sys.argv[2]))
+    roster.load_members()
+    site = Site.load(sys.argv[1])
+    unplaced = site.attach(roster)
+    print(site)
+    for primate in unplaced:
+        print(f"No {primate.group} enclosure has room for {primate.name}.")
@@ -0,0 +1,78 @@
+"""
+Contains the sorted secondary indexes the Enclosure keeps on primate age and weight.
+
+An index is a sorted list of (value, group, name) entries, spelt as they are on the primate and
+kept up to date from the Enclosure's change events. Range and nearest neighbour queries find
+their starting point by binary search, so they take O(log n + k) for k results.
+"""
+
+import bisect
+
+# Sorts after any name, so (value, highest) comes after every entry with that value
+highest = chr(0x10FFFF)
+
+
+class SortedIndex():
+    """A sorted index on one numeric field of the primates in an enclosure."""
+
+    def __init__(self, enclosure, field: str):
+        self.enclosure = enclosure
+        self.field = field
+        self.entries = []
+        self.rebuild()
+        enclosure.subscribe(self.handle)
+
+    def rebuild(self):
+        """Rebuilds the index from every primate in the enclosure."""
+        self.entries = sorted(
+            (int(getattr(primate, self.field)), primate.group, primate.name)
+            for primate in self.enclosure.enclosure_list
+        )
+
+    def insert(self, value, group: str, name: str):
+        bisect.insort(self.entries, (int(value), group, name))
+
+    def remove(self, value, group: str, name: str):
+        entry = (int(value), group, name)
+        position = bisect.bisect_left(self.entries, entry)
+        if position < len(self.entries) and self.entries[position] == entry:
+            del self.entries[position]
+
+    def handle(self, event):
+        """Updates the index from an Enclosure change event."""
+        if event.kind == "reset":
+            # update_enclosure_list() has already run, so the roster can be read again
+            self.rebuild()
+        elif event.kind == "added":
+            self.insert(getattr(event.new, self.field), event.group, event.name)
+        elif event.kind == "removed":
+            self.remove(getattr(event.old, self.field), event.group, event.name)
+        elif event.field == self.field:
+            self.remove(event.old, event.group, event.name)
+            self.insert(event.new, event.group, event.name)
+        elif event.field == "name":
+            primate = self.enclosure.get_primate(event.group.lower(), event.new.lower())
+            if primate is not None:
+                value = getattr(primate, self.field)
+                self.remove(value, event.group, event.old)
+                self.insert(value, event.group, event.new)
+
+    def range(self, low=None, high=None) -> list:
+        """Returns the (value, group, name) entries with low <= value <= high, in order."""
+        start = 0 if low is None else bisect.bisect_left(self.entries, (low,))
+        end = len(self.entries) if high is None else bisect.bisect_right(self.entries, (high, highest))
+        return self.entries[start:end]
+
+    def nearest(self, value, count: int = 5) -> list:
+        """Returns the count entries closest to value, closest first."""
+        right = bisect.bisect_left(self.entries, (value,))
+        left = right - 1
+        found = []
+        while len(found) < count and (left >= 0 or right < len(self.entries)):
+            if right >= len(self.entries) or (left >= 0 and value - self.entries[left][0] <= self.entries[right][0] - value):
+                found.append(self.entries[left])
+                left -= 1
+            else:
+                found.append(self.entries[right])
+                right += 1
+        return found
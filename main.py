@@ -18,10 +18,21 @@ education, and a deeper understanding of the diverse world of primates.
 """
 
 
+import argparse
+import os
 from functools import reduce
 from tabulate import tabulate
 from primate_classes import Enclosure, Chimpanzee, Orangutan, Bonobo, Capuchin, Gorilla
-from menu_options import staff_menu, update, menu, actions, enclosures, school, food
+from menu_options import staff_menu, update, search, menu, actions, enclosures, school, food
+from storage import open_storage
+from admission import AdmissionController, EnclosureFull
+from watcher import RosterWatcher
+from habitats import Site
+from feeding import load_stock, plan_feeding, apply_plan, start_day
+from session_io import ConsoleIO
+from renderer import BufferedIO, DiffIO
+import randomness
+import primate_classes
 
 
 def create_table(item_list: list, header: str) -> str:
@@ -36,10 +47,10 @@ def create_table(item_list: list, header: str) -> str:
 def req_group() -> str:
     """Requests user input for a group name, returns a validated name."""
     while True:
-        group = input("What group does the primate belong to?\n> ")
+        group = console.input("What group does the primate belong to?\n> ")
         # Handles group names not available in the zoo.
         if group.lower() not in ["chimpanzee", "orangutan", "bonobo", "capuchin", "gorilla"]:
-            print("Invalid group.")
+            console.print("Invalid group.")
             continue
         else:
             return group
@@ -47,53 +58,53 @@ def req_group() -> str:
 def req_name() -> str:
     """Requests user input for a primate name, returns a validated name."""
     while True:
-        new_name = input("What is the name of the primate ?\n> ")
+        new_name = console.input("What is the name of the primate ?\n> ")
         # Handles non alphabetical input
         if reduce(lambda x, y: x and (y.isalpha() or y.isspace()), new_name, True):
             return new_name
         else:
-            print("The name must only contain alphabetical characters.")
+            console.print("The name must only contain alphabetical characters.")
             continue
 
 def req_age() -> int:
     """Requests user input for a primate age, returns a validated age."""
     while True:
-        age = input("How old is the primate?\n> ")
+        age = console.input("How old is the primate?\n> ")
         # Handles non-numerical input and negative numbers
         if age.isnumeric():
             age = int(age)
             # Handles ages over 60
             if age > 60:
-                print("The age of the primate must be less than 60.")
+                console.print("The age of the primate must be less than 60.")
                 continue
             else:
                 return age
         else:
-            print("The age must be a valid number.")
+            console.print("The age must be a valid number.")
             continue
 
 def req_weight() -> int:
     """Requests user input for a primate weight, returns a validated weight."""
     while True:
-        weight = input("How much does the primate weigh in kg?\n> ")
+        weight = console.input("How much does the primate weigh in kg?\n> ")
         # Handles non-numerical input and negative numbers
         if weight.isnumeric():
             weight = int(weight)
             # Handles weight less than 1kg and over 200kg
             if weight <=1 or weight > 200:
-                print("The weight of the primate must be more than 1kg or less than 200kg.")
+                console.print("The weight of the primate must be more than 1kg or less than 200kg.")
                 continue
             else:
                 return weight
         else:
-            print("The weight must be a valid integer.")
+            console.print("The weight must be a valid integer.")
             continue
 
 def req_desc() -> str:
     """Requests user input for a primate description, returns a description string."""
     while True:
-        description = input("Provide a brief description of the primate\n> ")
-        desc_correct = input("Would you like to keep this description? (y/n)\n>")
+        description = console.input("Provide a brief description of the primate\n> ")
+        desc_correct = console.input("Would you like to keep this description? (y/n)\n>")
         # Gives the option to amend the description
         if desc_correct.lower() == "y":
             return description
@@ -103,20 +114,90 @@ def req_desc() -> str:
 def req_number(total: int) -> int:
     """Returns a validated user selected primate number as per the primate group table."""
     while True:
-        number = input("Enter a primate number (enter 0 to go back):\n> ")
+        number = console.input("Enter a primate number (enter 0 to go back):\n> ")
         # Handles non-numerical input and negative numbers
         if number.isnumeric():
             number = int(number)
             # Ensures input is within range
             if number > total:
-                print("Number out of range.\n")
+                console.print("Number out of range.\n")
                 continue
             else:
                 return number
         else:
-            print("Invalid option.\n")
+            console.print("Invalid option.\n")
             continue
 
+def req_search() -> list:
+    """
+    Requests a search of the form '20-30' (a range), '150+' (a minimum), '-10' (a maximum) or '45' (the
+    closest primates to a value). Returns the validated search as [low, high] or [value].
+    """
+    while True:
+        query = console.input("Enter a range such as 20-30, a minimum such as 150+, or a value to find the closest primates:\n> ")
+        query = query.replace(" ", "")
+        if query.endswith("+") and query[:-1].isnumeric():
+            return [int(query[:-1]), None]
+        low, separator, high = query.partition("-")
+        if separator and (low.isnumeric() or not low) and high.isnumeric():
+            return [int(low) if low else None, int(high)]
+        elif query.isnumeric():
+            return [int(query)]
+        else:
+            console.print("Invalid search.")
+            continue
+
+def search_primates(field: str, query: list):
+    """Prints a table of the primates matching a search on the age or weight index."""
+    if len(query) == 2:
+        results = enclosure.find_in_range(field, query[0], query[1])
+    else:
+        results = enclosure.find_nearest(field, query[0])
+
+    if results:
+        header = [field.capitalize(), "Group", "Name"]
+        console.print(tabulate(results, header, tablefmt="rounded_grid"))
+    else:
+        console.print("No primates found.")
+
+def update_primate(group: str, name: str, changes: dict):
+    """Applies the changes to a primate's details as one transaction."""
+    if not changes:
+        console.print("There are no changes to save.")
+        return
+    # The primate must still fit in its enclosure, or in another one it can move to
+    if "weight" in changes and site is not None and not site.can_hold(group, name, changes["weight"]):
+        console.print(f"There is no {group} enclosure with room for {name.capitalize()} at {changes['weight']}kg. The changes were not saved.")
+        return
+    with enclosure.transaction():
+        if "age" in changes:
+            enclosure.set_age(group, name, changes["age"])
+        if "weight" in changes:
+            enclosure.set_weight(group, name, changes["weight"])
+        if "description" in changes:
+            enclosure.set_desc(group, name, changes["description"])
+        # The name is changed last, as the other changes find the primate by its current name
+        if "name" in changes:
+            enclosure.set_name(group, name, changes["name"])
+    console.print("The changes have been saved.")
+
+def plan_feeding_round():
+    """Plans a feeding round for every hungry primate from the food in stock and applies it if staff agree."""
+    # The primates fed on an earlier day are hungry again
+    start_day(enclosure)
+    plan = plan_feeding(enclosure.enclosure_list, load_stock())
+    if not plan.meals:
+        console.print("There are no hungry primates that can be fed from the food in stock.")
+        return
+
+    console.print(plan)
+    if plan.unfed:
+        console.print(f"There isn't enough of the food they eat for {len(plan.unfed)} hungry primates.")
+    confirm = console.input(f"\nFeed {len(plan.meals)} primates? (y/n)\n> ")
+    if confirm.lower() == "y":
+        apply_plan(enclosure, plan)
+        console.print(f"{len(plan.meals)} primates have been fed!")
+
 def request_member_details(get_group=req_group, get_name=req_name, get_age=req_age, get_weight=req_weight, get_desc=req_desc) -> list:
     """
     Requests user input in order to create an instance of the respective primate class.
@@ -132,16 +213,16 @@ def request_member_details(get_group=req_group, get_name=req_name, get_age=req_a
 
         # Checks if user is satisfied that all the details are correct before returning the list
         table = [["NEW PRIMATE", ""],["Group:", group],["Name:", name],["Age:", age], ["Weight:", weight],["Description:", description]]
-        print(tabulate(table, headers="firstrow", tablefmt="rounded_grid"))
-        confirm = input("Are these details correct? (y/n)\n>")
+        console.print(tabulate(table, headers="firstrow", tablefmt="rounded_grid"))
+        confirm = console.input("Are these details correct? (y/n)\n>")
 
         if confirm.lower() == "y":
             return [group, name, age, weight, description]
         elif confirm.lower() == "n":
-            print("\n== Please enter the details again. ==\n")
+            console.print("\n== Please enter the details again. ==\n")
             continue
         else:
-            print("\n== Please select a valid option. ==\n")
+            console.print("\n== Please select a valid option. ==\n")
             continue
 
 def add_new_member(member_details: list):
@@ -164,21 +245,28 @@ def add_new_member(member_details: list):
     elif group == "gorilla":
         new_member = Gorilla(member_details[1], member_details[2], member_details[3], member_details[4])
 
+    # Checks there is a physical enclosure with room for the new member
+    if site is not None and site.find_enclosure(new_member.group, int(new_member.weight)) is None:
+        console.print(f"There is no {new_member.group} enclosure with room for {new_member.name.capitalize()}.")
+        return
+
     # Adds the new member to the enclosure and saves to the enclosure.txt file
-    enclosure.add_primate(new_member)
-    enclosure.update_enclosure_list()
-    enclosure.save_members()
-    print(f"{new_member.name.capitalize()} has been added to the {new_member.group} enclosure!")
+    with enclosure.transaction():
+        enclosure.add_primate(new_member)
+    console.print(f"{new_member.name.capitalize()} has been added to the {new_member.group} enclosure!")
+    if site is not None:
+        location = site.location_of(new_member.group, new_member.name)
+        console.print(f"They live in enclosure {location.enclosure_id} of the {location.habitat.name} habitat.")
 
 def select_primate(get_group, get_names, make_table) -> list:
     """Selects a primate object from the enclosure and returns a validated group_name and primate_name."""
     while True:
         # Generates a table of the primates in the enclosure
         group_list = get_group()
-        print(enclosure)
+        console.print(enclosure)
 
         # Requests user input for the primate group
-        group_name = input("\nTo select a primate, enter their group name ('b' to go back).\n> ")
+        group_name = console.input("\nTo select a primate, enter their group name ('b' to go back).\n> ")
         group_name = group_name.lower()
 
         # Checks if the user has entered a valid group option
@@ -186,10 +274,10 @@ def select_primate(get_group, get_names, make_table) -> list:
             while True:
                 # Generates a table of the names of primates in the selected group at the enclosure
                 names_list = get_names(group_name)
-                print()
-                print(make_table(names_list, f"{group_name.capitalize()}s in the enclosure:"), end="\n")
+                console.print()
+                console.print(make_table(names_list, f"{group_name.capitalize()}s in the enclosure:"), end="\n")
 
-                primate_name = input("\nEnter the name of the primate ('b' to go back).\n> ")
+                primate_name = console.input("\nEnter the name of the primate ('b' to go back).\n> ")
                 primate_name = primate_name.lower()
 
                 # Checks if the user has entered a valid name option
@@ -198,137 +286,158 @@ def select_primate(get_group, get_names, make_table) -> list:
                 elif primate_name == "b":
                     break
                 else:
-                    print("Please enter a valid name.\n")
+                    console.print("Please enter a valid name.\n")
                     continue
         elif group_name == "b":
             break
         else:
-            print("Please enter a valid group.\n")
+            console.print("Please enter a valid group.\n")
             continue
 
 def remove_primate(chosen_group: str, chosen_name: str):
     """Removes a primate from its respective enclosure list and updates the enclosure_list instance and enclosure.txt"""
     while True:
-        confirm = input(f"Are you sure you want to remove {chosen_name}? (y/n)\n >")
+        confirm = console.input(f"Are you sure you want to remove {chosen_name}? (y/n)\n >")
         if confirm.lower() == "y":
-            enclosure.remove_primate(chosen_group, chosen_name)
-            print(f"{chosen_name} has been removed from the enclosure.")
             # Removes the primate from self.enclosure_list and updates enclosure.txt
-            enclosure.update_enclosure_list()
-            enclosure.save_members()
+            with enclosure.transaction():
+                enclosure.remove_primate(chosen_group, chosen_name)
+            console.print(f"{chosen_name} has been removed from the enclosure.")
             break
         elif confirm.lower() == "n":
             break
         else:
-            print("Please enter a valid option.\n")
+            console.print("Please enter a valid option.\n")
             continue
 
 def login() -> str:
     """Asks the user to confirm login details (Staff or visitor) and returns 's' or 'v'."""
     while True:
         # Asks the user for a password if they log in as a member of staff
-        selection = input("Are you staff or a visitor? (s/v): \n> ")
+        selection = console.input("Are you staff or a visitor? (s/v): \n> ")
         if selection.lower() == "s":
-            password = input("What is the password?: ")
+            password = console.input("What is the password?: ")
             if password == "banana":
-                print("Welcome back!")
+                console.print("Welcome back!")
                 return "s"
             else:
-                print("Incorrect password.\n")
+                console.print("Incorrect password.\n")
                 continue
         elif selection == "v":
-            print("Welcome to the primate Paradise")
+            console.print("Welcome to the primate Paradise")
             return "v"
         else:
-            print("Please select a valid option.")
+            console.print("Please select a valid option.")
             continue
 
 def enter_enclosure(current_group: str, get_number):
     """Displays a menu for the user to allow them to interact with the selected primate group"""
-    while True:
-        # Prints a list of primate names in the current primate group as a table
-        names_list = enclosure.get_names_in_group(current_group)
-        print(create_table(names_list, f"{current_group.capitalize()}s"))
+    # Waits for a place if the enclosure is at capacity
+    wait = admission.estimated_wait(current_group)
+    if wait:
+        console.print(f"The enclosure is busy. The estimated wait is {round(wait)} seconds.")
+    try:
+        entered = admission.enter(current_group)
+    except EnclosureFull as error:
+        console.print(f"{error}\nPlease come back later.")
+        return
+
+    try:
+        while True:
+            # Prints a list of primate names in the current primate group as a table
+            names_list = enclosure.get_names_in_group(current_group)
+            console.print(create_table(names_list, f"{current_group.capitalize()}s"))
 
-        # Counts the number of members in the group
-        total_primates = len(names_list)
+            # Counts the number of members in the group
+            total_primates = len(names_list)
 
-        # Requests a number from the user from the primate table
-        primate_number = get_number(total_primates)
+            # Requests a number from the user from the primate table
+            primate_number = get_number(total_primates)
 
-        if primate_number == 0:
-            break
+            if primate_number == 0:
+                break
 
-        else:
-            # Gets the primate name from the table as per the selected number
-            primate_name = names_list[primate_number-1]
-            # Retrieves the primate object from the respective primate group list
-            active_primate = enclosure.get_primate(current_group, primate_name)
-            interact_with_primate(actions, food, active_primate)
+            else:
+                # Gets the primate name from the table as per the selected number
+                primate_name = names_list[primate_number-1]
+                # Retrieves the primate object from the respective primate group list
+                active_primate = enclosure.get_primate(current_group, primate_name)
+                interact_with_primate(actions, food, active_primate)
+                # The visitor has left the primate, so the primates not in use can be spilled
+                enclosure.trim_cache()
+    finally:
+        admission.leave(current_group, entered)
 
 def interact_with_primate(action_list: str, food_list: str, primate: object):
     """Allows the user to interact with the primate object given the available menu items"""
     
     # Displays information about the active primate
-    print(primate.get_description())
+    console.print(primate.get_description())
 
     while True:
 
         # Displays action list and requests user input
-        action = input(action_list)
+        action = console.input(action_list)
+
+        # Gives the primates a rest if the visitor is waving, feeding or taking photos too quickly
+        if action in ["1", "2", "3"] and not admission.allow_action(visitor):
+            console.print(f"Give {primate.name} a moment! Try again in {admission.retry_after(visitor):.0f} seconds.")
+            continue
 
         # Calls to the wave behaviour
         if action == "1":
-            print(f"\n{primate.wave()}")
+            console.print(f"\n{primate.wave()}")
         # Calls to the feed_primate behaviour
         elif action == "2":
-            food_letter = input(food_list)
-            print()
+            food_letter = console.input(food_list)
+            console.print()
             if food_letter.lower() == "a":
-                print(primate.feed_primate("apple"))
+                console.print(primate.feed_primate("apple"))
             elif food_letter.lower() == "b":
-                print(primate.feed_primate("banana"))
+                console.print(primate.feed_primate("banana"))
             elif food_letter.lower() == "c":
-                print(primate.feed_primate("cucumber"))
+                console.print(primate.feed_primate("cucumber"))
             elif food_letter.lower() == "d":
-                print(primate.feed_primate("date"))
+                console.print(primate.feed_primate("date"))
             elif food_letter.lower() == "0":
                 continue
             else:
-                print("Invalid option.")
+                console.print("Invalid option.")
         # Calls the the take_photo behaviour
         elif action == "3":
-            print(f"\n{primate.take_photo()}")
+            console.print(f"\n{primate.take_photo()}")
         elif action == "0":
             break
         else:
-            print("Invalid Option.")
+            console.print("Invalid Option.")
 
 def display_group_attr(group):
     """Prints the group attributes for the respective group by taking in the group class"""
-    print(f"Scientific name: {group.scientific_name}")
-    print(f"Population: {group.population}")
-    print(f"Status: {group.endangered_level}")
-    print(f"Fun fact: {group.fact}")
-    print(f"Easter Egg: {group.easter_egg}\n")
+    console.print(f"Scientific name: {group.scientific_name}")
+    console.print(f"Population: {group.population}")
+    console.print(f"Status: {group.endangered_level}")
+    console.print(f"Fun fact: {group.fact}")
+    console.print(f"Easter Egg: {group.easter_egg}\n")
 
 def main():
 
+    current_user = login()
+
     if current_user == "s":
         # === Loops through the staff menu === #
         while True:
-            menu_selection = input(staff_menu)
+            menu_selection = console.input(staff_menu)
             if menu_selection == "1":
-                print("=== View primates in the enclosure ===\n")
-                print(enclosure)
+                console.print("=== View primates in the enclosure ===\n")
+                console.print(enclosure)
 
             elif menu_selection == "2":
-                print("=== Add a primates to the enclosure ===\n")
+                console.print("=== Add a primates to the enclosure ===\n")
                 new_primate = request_member_details()
                 add_new_member(new_primate)
 
             elif menu_selection == "3":
-                print("=== Remove a primates from the enclosure ===\n")
+                console.print("=== Remove a primates from the enclosure ===\n")
                 primate = select_primate(enclosure.get_groups_in_enclosure, enclosure.get_names_in_group, create_table)
 
                 if primate is not None:
@@ -337,86 +446,103 @@ def main():
                     remove_primate(group, name)
 
             elif menu_selection == "4":
-                print("=== Update primate details ===\n")
+                console.print("=== Update primate details ===\n")
 
                 # Loops through the update menu
                 while True:
-                    print("Please select the primate you would like to update:\n")
+                    console.print("Please select the primate you would like to update:\n")
                     primate = select_primate(enclosure.get_groups_in_enclosure, enclosure.get_names_in_group, create_table)
 
-                    if primate is not None:
-                        group = primate[0]
-                        name = primate[1]
+                    if primate is None:
+                        break
+                    group = primate[0]
+                    name = primate[1]
 
-                        update_selection = input(update)
+                    # Changes are collected and then saved together as one transaction, which is undone as one
+                    changes = {}
+                    while True:
+                        update_selection = console.input(update)
 
                         if update_selection == "1":
-                            new_name = req_name()
-                            enclosure.set_name(group, name, new_name)
-
+                            changes["name"] = req_name()
                         elif update_selection == "2":
-                            new_age = req_age()
-                            enclosure.set_age(group, name, new_age)
-
+                            changes["age"] = req_age()
                         elif update_selection == "3":
-                            new_weight = req_weight()
-                            enclosure.set_weight(group, name, new_weight)
-
+                            changes["weight"] = req_weight()
                         elif update_selection == "4":
-                            new_desc = req_desc()
-                            enclosure.set_desc(group, name, new_desc)
-
+                            changes["description"] = req_desc()
+                        elif update_selection == "5":
+                            update_primate(group, name, changes)
+                            break
                         elif update_selection == "0":
                             break
-
                         else:
-                            print("Please select a valid option\n")
+                            console.print("Please select a valid option\n")
 
-                        enclosure.update_enclosure_list()
-                        enclosure.save_members()
-
-                    else:
+                    if update_selection == "0":
                         break
 
+            elif menu_selection == "5":
+                console.print("=== Undo last change ===\n")
+                if enclosure.undo():
+                    console.print("The last change has been undone.")
+                else:
+                    console.print("There is nothing to undo.")
+
+            elif menu_selection == "6":
+                console.print("=== Search primates by age or weight ===\n")
+                search_selection = console.input(search)
+
+                if search_selection == "1":
+                    search_primates("age", req_search())
+                elif search_selection == "2":
+                    search_primates("weight", req_search())
+                elif search_selection != "0":
+                    console.print("Please select a valid option\n")
+
+            elif menu_selection == "7":
+                console.print("=== Plan a feeding round ===\n")
+                plan_feeding_round()
+
             elif menu_selection == "0":
-                print("Thank you for visiting primate Paradise!")
+                console.print("Thank you for visiting primate Paradise!")
                 break
             else:
-                print("Please select a valid option\n")
+                console.print("Please select a valid option\n")
 
     elif current_user == "v":
         # === Loops through the visitor menu === #
         while True:
-            menu_selection = input(menu)
+            menu_selection = console.input(menu)
             if menu_selection == "1":
 
                 # Allows the user to enter the enclosure and interact with the selected primate objects
                 while True:
 
-                    enclosure_selection = input(enclosures)
+                    enclosure_selection = console.input(enclosures)
 
                     if enclosure_selection == "1":
-                        print("\n=== Visiting Crafty Chimpanzees ===\n")
+                        console.print("\n=== Visiting Crafty Chimpanzees ===\n")
                         active_group = "chimpanzee"
                         enter_enclosure(current_group=active_group, get_number=req_number)
 
                     elif enclosure_selection == "2":
-                        print("\n=== Visiting Outrageous Orangutans ===\n")
+                        console.print("\n=== Visiting Outrageous Orangutans ===\n")
                         active_group = "orangutan"
                         enter_enclosure(current_group=active_group, get_number=req_number)
 
                     elif enclosure_selection == "3":
-                        print("\n=== Visiting Beautiful Bonobos ===\n")
+                        console.print("\n=== Visiting Beautiful Bonobos ===\n")
                         active_group = "bonobo"
                         enter_enclosure(current_group=active_group, get_number=req_number)
 
                     elif enclosure_selection == "4":
-                        print("\n=== Visiting Cheeky Capuchins ===\n")
+                        console.print("\n=== Visiting Cheeky Capuchins ===\n")
                         active_group = "capuchin"
                         enter_enclosure(current_group=active_group, get_number=req_number)
 
                     elif enclosure_selection == "5":
-                        print("\n=== Visiting Grizzly Gorillas ===\n")
+                        console.print("\n=== Visiting Grizzly Gorillas ===\n")
                         active_group = "gorilla"
                         enter_enclosure(current_group=active_group, get_number=req_number)
 
@@ -424,50 +550,86 @@ def main():
                         break
 
                     else:
-                        print("Please select a valid option")
+                        console.print("Please select a valid option")
 
             elif menu_selection == "2":
 
                 # Displays the class attributes for the respective primate classes
                 while True:
 
-                    school_selection = input(school)
+                    school_selection = console.input(school)
 
                     if school_selection == "1":
-                        print("\n=== Chimpanzees ===\n")
+                        console.print("\n=== Chimpanzees ===\n")
                         display_group_attr(Chimpanzee)
 
                     elif school_selection == "2":
-                        print("\n=== Orangutans ===\n")
+                        console.print("\n=== Orangutans ===\n")
                         display_group_attr(Orangutan)
 
                     elif school_selection == "3":
-                        print("\n=== Bonobos ===\n")
+                        console.print("\n=== Bonobos ===\n")
                         display_group_attr(Bonobo)
 
                     elif school_selection == "4":
-                        print("\n=== Capuchins ===\n")
+                        console.print("\n=== Capuchins ===\n")
                         display_group_attr(Capuchin)
 
                     elif school_selection == "5":
-                        print("\n=== Gorillas ===\n")
+                        console.print("\n=== Gorillas ===\n")
                         display_group_attr(Gorilla)
 
                     elif school_selection == "0":
                         break
 
                     else:
-                        print("Please select a valid option")
+                        console.print("Please select a valid option")
 
             elif menu_selection == "0":
-                print("Thank you for visiting primate Paradise!")
+                console.print("Thank you for visiting primate Paradise!")
                 break
             else:
-                print("Please select a valid option")
+                console.print("Please select a valid option")
+
+def play_sound(path: str):
+    """Plays a primate's sound effect through whichever console is in use."""
+    console.play(path)
 
-current_user = login()
+# All input and output goes through the console so sessions can be recorded and replayed (see replay.py)
+console = ConsoleIO()
+primate_classes.sound_player = play_sound
 enclosure = Enclosure()
-enclosure.load_members()
+# Limits the visitors at each enclosure and how quickly the visitor at this console can act
+admission = AdmissionController()
+visitor = "console"
+# The physical habitats and enclosures, if a site layout has been loaded (see habitats.py)
+site = None
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Primate Paradise")
+    parser.add_argument("roster", nargs="?", default="enclosure.txt", help="roster file, e.g. enclosure.db")
+    parser.add_argument("--screen", choices=["plain", "buffered", "diff"], default="buffered",
+                        help="print straight away, write one screen at a time, or redraw only changed lines")
+    parser.add_argument("--seed", type=int, help="seed for the primates' reactions, to make a visit repeatable")
+    parser.add_argument("--site", default="site.json", help="layout of the physical enclosures, not used if the file doesn't exist")
+    parser.add_argument("--cache-size", type=int, help="keep only this many recently used primates in memory as live objects")
+    parser.add_argument("--no-watch", action="store_true", help="don't pick up changes other programs make to the roster")
+    args = parser.parse_args()
+
+    randomness.seed(args.seed)
+    if args.screen == "buffered":
+        console = BufferedIO()
+    elif args.screen == "diff":
+        console = DiffIO()
+    enclosure = Enclosure(open_storage(args.roster), cache_size=args.cache_size)
+    enclosure.load_members()
+    if os.path.exists(args.site):
+        site = Site.load(args.site)
+        for primate in site.attach(enclosure):
+            console.print(f"Warning: no {primate.group} enclosure has room for {primate.name}.")
+    if not args.no_watch:
+        RosterWatcher(enclosure, args.roster).start()
+    try:
+        main()
+    finally:
+        console.flush()
@@ -4,6 +4,9 @@ What would you like to do?:
 2 - Add a primates to the enclosure
 3 - Remove a primate from the enclosure
 4 - Update primate details
+5 - Undo last change
+6 - Search primates by age or weight
+7 - Plan a feeding round
 
 0 - Leave the Zoo
 > """
@@ -14,6 +17,7 @@ What would you like to update?:
 2 - Age
 3 - Weight
 4 - Description
+5 - Save changes
 
 0 - Cancel
 > """
@@ -48,6 +52,14 @@ What group would you like to learn about?:
 0 - Return to Main Menu
 > """
 
+search = """
+What would you like to search by?:
+1 - Age
+2 - Weight
+
+0 - Cancel
+> """
+
 actions = """
 What would you like to do?:
 1 - Wave
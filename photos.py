@@ -0,0 +1,177 @@
+"""
+Renders the photos visitors take of the primates as ASCII art.
+
+Source images live in the photos directory, either one per species (photos/gorilla.pgm) or one
+per animal (photos/gorilla/king kong.pgm), which wins over the species photo. Netpbm images
+(.pgm/.ppm) are read directly and other formats are read with Pillow when it is installed.
+
+No source images are shipped (see photos/README.md). Without one, or without NumPy to render it,
+a primate falls back to the art built into the program: the ASCII chimpanzee for chimpanzees and a
+text response for the other species.
+
+Rendered art is stored in a content addressed cache, named by the hash of the source image and
+the render settings, so a photo is only rendered again when its source changes. Rendering needs
+NumPy, but serving art that is already cached does not. To render every photo ahead of time:
+    python photos.py build
+"""
+
+import hashlib
+import os
+import sys
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+photo_directory = "photos"
+cache_directory = ".photo_cache"
+image_extensions = (".pgm", ".ppm", ".png", ".jpg", ".jpeg", ".gif", ".bmp")
+# From the darkest to the lightest glyph
+glyphs = "@%#*+=-:. "
+width = 60
+
+# Cached art by (path, modification time, size), so known sources aren't hashed again
+_rendered = {}
+
+
+class PhotoUnavailable(Exception):
+    """Raised when a source image can't be rendered because NumPy or Pillow isn't installed."""
+
+
+def read_netpbm(data: bytes):
+    """Returns the luminance of a P2, P3, P5 or P6 netpbm image as an array of values from 0 to 1."""
+    tokens = []
+    position = 0
+    # The header holds the magic number, width, height and maximum value, with optional comments
+    while len(tokens) < 4:
+        while data[position:position + 1].isspace():
+            position += 1
+        if position >= len(data):
+            raise ValueError("The image header is truncated.")
+        if data[position:position + 1] == b"#":
+            position = data.index(b"\n", position)
+            continue
+        start = position
+        while position < len(data) and not data[position:position + 1].isspace():
+            position += 1
+        tokens.append(data[start:position])
+    magic, columns, rows, maximum = tokens[0], int(tokens[1]), int(tokens[2]), int(tokens[3])
+    channels = 3 if magic in (b"P3", b"P6") else 1
+
+    if magic in (b"P5", b"P6"):
+        dtype = ">u2" if maximum > 255 else "u1"
+        pixels = numpy.frombuffer(data[position + 1:], dtype=dtype, count=rows * columns * channels)
+    elif magic in (b"P2", b"P3"):
+        pixels = numpy.array(data[position:].split()[:rows * columns * channels], dtype=float)
+    else:
+        raise ValueError("Unsupported image format.")
+
+    pixels = pixels.astype(float).reshape(rows, columns, channels) / maximum
+    if channels == 3:
+        return pixels @ numpy.array([0.299, 0.587, 0.114])
+    return pixels[:, :, 0]
+
+
+def read_image(path: str, data: bytes):
+    """Returns the luminance of an image as an array of values from 0 to 1."""
+    if path.lower().endswith((".pgm", ".ppm")):
+        return read_netpbm(data)
+    try:
+        from PIL import Image
+    except ImportError:
+        raise PhotoUnavailable(f"Pillow is needed to read {path}.")
+    with Image.open(path) as image:
+        return numpy.asarray(image.convert("L"), dtype=float) / 255
+
+
+def to_ascii(luminance, columns: int = width, ramp: str = glyphs) -> str:
+    """Returns the image as ASCII art, columns characters wide."""
+    height, image_width = luminance.shape
+    columns = min(columns, image_width)
+    # Characters are about twice as tall as they are wide
+    rows = max(1, round(height * columns / image_width / 2))
+
+    # Each character takes the average luminance of the block of pixels it covers
+    row_edges = numpy.linspace(0, height, rows + 1).astype(int)
+    column_edges = numpy.linspace(0, image_width, columns + 1).astype(int)
+    sums = numpy.add.reduceat(numpy.add.reduceat(luminance, row_edges[:-1], axis=0), column_edges[:-1], axis=1)
+    counts = numpy.outer(numpy.diff(row_edges), numpy.diff(column_edges))
+    average = sums / counts
+
+    indexes = numpy.clip((average * (len(ramp) - 1)).round().astype(int), 0, len(ramp) - 1)
+    characters = numpy.array(list(ramp))[indexes]
+    return "\n".join("".join(row) for row in characters) + "\n"
+
+
+def find_source(group: str, name: str = None) -> str:
+    """Returns the source image for a primate, or for its species, or None if there isn't one."""
+    candidates = []
+    if name is not None:
+        candidates += [os.path.join(photo_directory, group, name + extension) for extension in image_extensions]
+    candidates += [os.path.join(photo_directory, group + extension) for extension in image_extensions]
+    for path in candidates:
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def render(path: str) -> str:
+    """Returns the ASCII art for a source image, rendering and caching it if it isn't cached yet."""
+    stat = os.stat(path)
+    known = (path, stat.st_mtime_ns, stat.st_size)
+    if known in _rendered:
+        return _rendered[known]
+
+    with open(path, "rb") as file:
+        data = file.read()
+    digest = hashlib.sha256(data + f"{width}:{glyphs}".encode("UTF-8")).hexdigest()
+    cached = os.path.join(cache_directory, digest + ".txt")
+    if os.path.exists(cached):
+        with open(cached, "r", encoding="UTF-8") as file:
+            art = file.read()
+    else:
+        if numpy is None:
+            raise PhotoUnavailable("NumPy is needed to render photos.")
+        art = to_ascii(read_image(path, data))
+        os.makedirs(cache_directory, exist_ok=True)
+        temporary = f"{cached}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="UTF-8") as file:
+            file.write(art)
+        os.replace(temporary, cached)
+
+    _rendered[known] = art
+    return art
+
+
+def photo_for(primate, fallback: str = None) -> str:
+    """
+    Returns the ASCII art for a primate, or the fallback if there is no photo of it or its species,
+    the photo can't be rendered here or it can't be decoded.
+    """
+    path = find_source(primate.group.lower(), primate.name.lower())
+    if path is None:
+        return fallback
+    try:
+        return render(path)
+    # A truncated or corrupt image shouldn't stop the primate being shown
+    except (PhotoUnavailable, ValueError, OSError, IndexError):
+        return fallback
+
+
+def build() -> int:
+    """Renders every source image into the cache and returns how many there are."""
+    total = 0
+    for directory, _, files in os.walk(photo_directory):
+        for file_name in sorted(files):
+            if file_name.lower().endswith(image_extensions):
+                render(os.path.join(directory, file_name))
+                total += 1
+    return total
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["build"]:
+        print("Usage: python photos.py build")
+        sys.exit(1)
+    print(f"Rendered {build()} photos into {cache_directory}.")
@@ -1,27 +1,69 @@
 """Contains the Enclosure and various primate classes for the primate Paradise Program."""
 
-from random import randint
+import copy
+import threading
+from contextlib import contextmanager
 from tabulate import tabulate
 from playsound import playsound
 from ascii import chimp_image
+from storage import TextFileStorage
+from events import ChangeEvent, Subscription
+from indexes import SortedIndex
+from cache import PrimateCache, SpilledPrimate
+import randomness
+import photos
+
+# Plays the primates' sound effects. main.py sends them through its console instead, so recorded
+# sessions note them and replays stay silent
+sound_player = playsound
 
 
 class Enclosure():
     """
     This class represents a parent object that contains lists of child objects as its attributes.
     The objects are stored in the respective list attribute defined as the group name of the primate.
+
+    Edits made in a transaction are journaled: each one records how to reverse it (the position a
+    primate was added at, or the primate that was removed or replaced), and a primate is copied the
+    first time it changes so the journal keeps the old one. The undo history keeps these journals,
+    so it grows with the size of the edits rather than the size of the roster.
+
+    With a cache_size, only that many recently used primates are kept as live objects and the rest
+    are spilled to a compact form until they are needed again (see cache.py).
     """
 
-    def __init__(self):
+    groups = ["chimpanzee", "orangutan", "bonobo", "capuchin", "gorilla"]
+
+    def __init__(self, storage=None, history_limit=10, cache_size=None):
         self.chimpanzee_list = []
         self.orangutan_list = []
         self.bonobo_list = []
         self.capuchin_list = []
         self.gorilla_list = []
         self.enclosure_list = []
+        # Backend that persists the members, see storage.py
+        self.storage = storage if storage is not None else TextFileStorage("enclosure.txt")
+        self.version = 0
+        # Held by anything that shares the enclosure between threads, such as the HTTP API
+        self.lock = threading.RLock()
+        self._table = (None, "")
+        self.history = []
+        self.history_limit = history_limit
+        # The journal of the transaction in progress, or None
+        self._transaction = None
+        # Ids of the primates already copied in the transaction in progress
+        self._owned_members = set()
+        self.subscribers = []
+        self.cache = PrimateCache(self, cache_size) if cache_size else None
+        # Sorted indexes for age and weight queries, kept up to date through change events
+        self.age_index = SortedIndex(self, "age")
+        self.weight_index = SortedIndex(self, "weight")
 
     def __str__(self):
         """Returns all the members in the enclosure, in a table format."""
+        # The table is only rebuilt when the roster has changed since it was last made
+        if self._table[0] == self.version:
+            return self._table[1]
         header = ["Group", "Name"]
         data = []
         for primate in self.chimpanzee_list:
@@ -35,7 +77,8 @@ class Enclosure():
         for primate in self.gorilla_list:
             data.append([primate.group, primate.name])
 
-        return tabulate(data, header, tablefmt="rounded_grid")
+        self._table = (self.version, tabulate(data, header, tablefmt="rounded_grid"))
+        return self._table[1]
 
     def update_enclosure_list(self):
         """Updates the enclosure list attribute with any changes made to any of the individual group list attributes"""
@@ -46,67 +89,333 @@ class Enclosure():
         self.enclosure_list += self.capuchin_list
         self.enclosure_list += self.gorilla_list
 
+    def _log(self, change: tuple):
+        """
+        Records how to reverse an edit in the journal of the transaction in progress. An edit made
+        outside a transaction would shift the positions the history relies on, so it clears the history.
+        """
+        if self._transaction is not None:
+            self._transaction.append(change)
+        else:
+            self.history = []
+
+    def _reverse(self, journal: list):
+        """Reverses the edits recorded in a journal, newest first."""
+        for change in reversed(journal):
+            members = getattr(self, f"{change[1]}_list")
+            if change[0] == "insert":
+                del members[change[2]]
+            elif change[0] == "remove":
+                members.insert(change[2], change[3])
+            elif change[0] == "replace":
+                members[change[2]] = change[3]
+        self._owned_members = set()
+        self.version += 1
+        self.update_enclosure_list()
+        self._publish("reset", "", "")
+
+    def subscribe(self, callback, batch: bool = False) -> Subscription:
+        """
+        Calls callback with a ChangeEvent for every change to the roster (see events.py). A batch
+        subscriber is instead called with a coalesced list of events each time the changes are saved.
+        """
+        subscription = Subscription(callback, batch)
+        self.subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscribers.remove(subscription)
+
+    def _publish(self, kind: str, group: str, name: str, field: str = None, old=None, new=None):
+        if self.subscribers:
+            event = ChangeEvent(kind, group, name, field, old, new)
+            for subscription in list(self.subscribers):
+                subscription.deliver(event)
+
+    def flush_events(self):
+        """Delivers the pending events of every batch subscriber."""
+        for subscription in list(self.subscribers):
+            subscription.flush()
+
+    def _find(self, group: str, primate_name: str) -> object:
+        """Returns the primate with the given name in a group, or None."""
+        if group in self.groups:
+            for member in getattr(self, f"{group}_list"):
+                if member.name.lower() == primate_name:
+                    return member
+
+    def _copy_on_write(self, group: str, primate_name: str = None):
+        """Makes the named primate, if given, ready to be edited (see _own())."""
+        if group not in self.groups:
+            return
+        # Every edit to the roster passes through here
+        self.version += 1
+        if primate_name is not None:
+            members = getattr(self, f"{group}_list")
+            for i, member in enumerate(members):
+                if member.name.lower() == primate_name:
+                    self._own(group, members, i)
+
+    def _own(self, group: str, members: list, position: int) -> object:
+        """
+        Returns the primate at a position of a group list, ready to be edited: restored if it was
+        spilled from the cache and, the first time it changes in a transaction, replaced by a copy
+        so the journal keeps the old one.
+        """
+        member = members[position] if self.cache is None else self.cache.materialise(members, position)
+        if id(member) not in self._owned_members:
+            self._log(("replace", group, position, member))
+            if self._transaction is not None:
+                members[position] = member = copy.copy(member)
+                self._owned_members.add(id(member))
+                if self.cache is not None:
+                    self.cache.touch(member)
+        return member
+
+    def begin(self):
+        """Starts a transaction. Edits made until commit() or rollback() are applied as one change."""
+        if self._transaction is not None:
+            raise Exception("A transaction is already in progress.")
+        self._transaction = []
+        self._owned_members = set()
+
+    def in_transaction(self) -> bool:
+        return self._transaction is not None
+
+    def commit(self):
+        """Commits the current transaction, records it in the undo history and saves the members once."""
+        if self._transaction is None:
+            raise Exception("No transaction in progress.")
+        if self._transaction:
+            self.history.append(self._transaction)
+            del self.history[:-self.history_limit]
+        self._transaction = None
+        self._owned_members = set()
+        self.update_enclosure_list()
+        self.save_members()
+        if self.cache is not None:
+            # Storage has just been written, so spilled primates can be read back from it
+            self.cache.evict(synced=True)
+
+    def rollback(self):
+        """Discards every edit made since the current transaction began."""
+        if self._transaction is None:
+            raise Exception("No transaction in progress.")
+        journal = self._transaction
+        self._transaction = None
+        self.storage.rollback()
+        self._reverse(journal)
+        self.flush_events()
+
+    @contextmanager
+    def transaction(self):
+        """Context manager that commits on success and rolls back if an exception is raised."""
+        # Holding the lock keeps background threads, such as the roster watcher, out of the transaction
+        with self.lock:
+            self.begin()
+            try:
+                yield self
+            except BaseException:
+                self.rollback()
+                raise
+            self.commit()
+
+    def undo(self) -> bool:
+        """Reverts the last committed transaction. Returns False if there is nothing to undo."""
+        # Holding the lock keeps the roster watcher from merging part way through
+        with self.lock:
+            if not self.history:
+                return False
+            self._reverse(self.history.pop())
+            # The restored version can differ from storage in many rows, so it is rewritten in full
+            self.storage.save(primate.to_row() for primate in self.enclosure_list)
+            self.flush_events()
+            return True
+
     def add_primate(self, member):
         """Adds a primate to the respective primate list based on the group attribute of said primate."""
-        if member.group == "Chimpanzee":
-            self.chimpanzee_list.append(member)
-        elif member.group == "Orangutan":
-            self.orangutan_list.append(member)
-        elif member.group == "Bonobo":
-            self.bonobo_list.append(member)
-        elif member.group == "Capuchin":
-            self.capuchin_list.append(member)
-        elif member.group == "Gorilla":
-            self.gorilla_list.append(member)
-        else:
+        self._insert(member)
+        self.storage.add(member.to_row())
+        self._publish("added", member.group, member.name, new=member)
+
+    def _insert(self, member):
+        """Adds a primate to its group list without writing it to storage."""
+        group = member.group.lower()
+        if group not in self.groups:
             raise Exception("Check the group type of the member.")
+        self._copy_on_write(group)
+        # A new primate isn't in the journal, so it can be edited without being copied
+        if self._transaction is not None:
+            self._owned_members.add(id(member))
+        if self.cache is not None and not isinstance(member, SpilledPrimate):
+            self.cache.touch(member)
+        members = getattr(self, f"{group}_list")
+        self._log(("insert", group, len(members)))
+        members.append(member)
 
     def remove_primate(self, group, primate_name):
         """Removes the primate object from its respective group list."""
-        if group == "chimpanzee":
-            for member in self.chimpanzee_list:
-                if member.name.lower() == primate_name:
-                    self.chimpanzee_list.remove(member)
-        elif group == "orangutan":
-            for member in self.orangutan_list:
-                if member.name.lower() == primate_name:
-                    self.orangutan_list.remove(member)
-        elif group == "bonobo":
-            for member in self.bonobo_list:
-                if member.name.lower() == primate_name:
-                    self.bonobo_list.remove(member)
-        elif group == "capuchin":
-            for member in self.capuchin_list:
-                if member.name.lower() == primate_name:
-                    self.capuchin_list.remove(member)
-        elif group == "gorilla":
-            for member in self.gorilla_list:
-                if member.name.lower() == primate_name:
-                    self.gorilla_list.remove(member)
+        removed = self._find(group, primate_name)
+        self._copy_on_write(group)
+        if removed is not None:
+            self._discard(removed)
+        self.storage.remove(group, primate_name)
+
+    def _discard(self, member):
+        """Removes a primate from its group list without removing it from storage."""
+        group = member.group.lower()
+        self._copy_on_write(group)
+        members = getattr(self, f"{group}_list")
+        position = members.index(member)
+        del members[position]
+        self._log(("remove", group, position, member))
+        self._publish("removed", member.group, member.name, old=member)
+
+    def feed_primates(self, meals: list) -> list:
+        """
+        Feeds a batch of primates, given [group, name, food] for each one, and returns what each
+        primate did. The primates are found in one pass over each group list.
+        """
+        responses = []
+        by_group = {}
+        for group, name, food in meals:
+            by_group.setdefault(group, {})[name] = food
+        for group, foods in by_group.items():
+            self._copy_on_write(group)
+            members = getattr(self, f"{group}_list")
+            for i, member in enumerate(members):
+                food = foods.get(member.name.lower())
+                if food is None:
+                    continue
+                member = self._own(group, members, i)
+                was_hungry = member.hungry
+                responses.append(member.feed_primate(food))
+                if member.hungry != was_hungry:
+                    self.storage.update(group, member.name, "hungry", member.hungry)
+                    self._publish("changed", member.group, member.name, "hungry", was_hungry, member.hungry)
+        self.update_enclosure_list()
+        return responses
+
+    def reset_hunger(self) -> int:
+        """Makes every primate that has been fed hungry again and returns how many there were."""
+        count = 0
+        for group in self.groups:
+            members = getattr(self, f"{group}_list")
+            for i, member in enumerate(members):
+                if member.hungry:
+                    continue
+                if count == 0:
+                    # Marks the roster as changed, once
+                    self._copy_on_write(group)
+                member = self._own(group, members, i)
+                member.hungry = True
+                self.storage.update(group, member.name, "hungry", True)
+                self._publish("changed", member.group, member.name, "hungry", False, True)
+                count += 1
+        self.update_enclosure_list()
+        return count
 
     def save_members(self):
-        """Writes all the members in the enclosure_list to the 'enclosure.txt' file"""
-        with open("enclosure.txt", "w", encoding="UTF-8") as file:
-            for primate in self.enclosure_list:
-                file.write(f"{primate.group};{primate.name};{primate.age};{primate.weight};{primate.description};{primate.hungry}\n")
+        """Writes all the members in the enclosure_list to storage (the 'enclosure.txt' file by default)"""
+        self.storage.commit(primate.to_row() for primate in self.enclosure_list)
+        self.flush_events()
 
     def load_members(self):
-        """Imports all the members in the enclosure.txt file and adds them to their respective group lists."""
-        with open("enclosure.txt", "r", encoding="UTF-8") as file:
-            for line in file:
-                group, name, age, weight, description, hungry = line.strip().split(";")
-                # For each member of the primate group this will add each object as per its group
-                if group == "Chimpanzee":
-                    self.add_primate(Chimpanzee(name, age, weight, description))
-                elif group == "Orangutan":
-                    self.add_primate(Orangutan(name, age, weight, description))
-                elif group == "Bonobo":
-                    self.add_primate(Bonobo(name, age, weight, description))
-                elif group == "Capuchin":
-                    self.add_primate(Capuchin(name, age, weight, description))
-                elif group == "Gorilla":
-                    self.add_primate(Gorilla(name, age, weight, description))
-            self.enclosure_list = self.chimpanzee_list + self.orangutan_list + self.bonobo_list + self.capuchin_list + self.gorilla_list
+        """Imports all the members from storage and adds them to their respective group lists."""
+        self.load_rows(self.storage.stream())
+
+    def load_rows(self, rows) -> int:
+        """
+        Adds a member for each storage row to its group list and returns the number added. With a
+        cache, the members loaded once it is full are spilled straight away, so the whole roster is
+        never live at once.
+        """
+        count = 0
+        for group, name, age, weight, description, hungry in rows:
+            member = create_primate(group, name, age, weight, description, str(hungry) != "False")
+            if member is not None:
+                if self.cache is not None:
+                    member = self.cache.admit(member)
+                self._insert(member)
+                count += 1
+        self.enclosure_list = self.chimpanzee_list + self.orangutan_list + self.bonobo_list + self.capuchin_list + self.gorilla_list
+        # Loading publishes a single reset rather than an event per member
+        self._publish("reset", "", "")
+        self.flush_events()
+        return count
+
+    def merge_rows(self, rows) -> int:
+        """
+        Brings the roster in line with rows read from storage after another program changed it,
+        adding, removing or updating only the members that differ. Returns the number of changes.
+        The undo history is cleared if anything changed, as undoing an earlier edit would write
+        the roster from before the merge back over the other program's changes.
+        """
+        current = {(primate.group.lower(), primate.name.lower()): primate for primate in self.enclosure_list}
+        incoming = {(row[0].lower(), row[1].lower()): row for row in rows}
+        changes = 0
+
+        # The rows are already in storage, so every change is only made in memory
+        for key in current.keys() - incoming.keys():
+            self._discard(current[key])
+            changes += 1
+        for key, row in incoming.items():
+            primate = current.get(key)
+            if primate is None:
+                member = create_primate(*row[:5])
+                if member is not None:
+                    self._insert(member)
+                    self._publish("added", member.group, member.name, new=member)
+                    changes += 1
+                continue
+            values = {"name": row[1], "age": int(row[2]), "weight": int(row[3]), "description": row[4]}
+            # Members loaded from storage keep their age and weight as text
+            changed = [field for field, value in values.items() if str(getattr(primate, field)) != str(value)]
+            if changed:
+                members = getattr(self, f"{key[0]}_list")
+                self._copy_on_write(key[0])
+                member = self._own(key[0], members, members.index(primate))
+                for field in changed:
+                    old_value = getattr(member, field)
+                    setattr(member, field, values[field])
+                    self._publish("changed", member.group, old_value if field == "name" else member.name, field, old_value, values[field])
+                changes += len(changed)
+
+        if changes:
+            self.history = []
+        self.update_enclosure_list()
+        self.flush_events()
+        return changes
+
+    def trim_cache(self):
+        """
+        Spills the least recently used primates if the cache has grown too big. Only call it once
+        nothing holds a primate from get_primate(), as changes made to a spilled primate are lost.
+        """
+        with self.lock:
+            if self.cache is not None:
+                self.cache.evict()
+
+    def cache_stats(self) -> dict:
+        """Returns the statistics of the primate cache, or None if the enclosure has no cache."""
+        if self.cache is not None:
+            return self.cache.stats()
+
+    def _index(self, field: str) -> SortedIndex:
+        if field == "age":
+            return self.age_index
+        elif field == "weight":
+            return self.weight_index
+        else:
+            raise Exception("Only age and weight are indexed.")
+
+    def find_in_range(self, field: str, low: int = None, high: int = None) -> list:
+        """Returns [value, group, name] for each primate whose age or weight is from low to high, in order."""
+        return [list(entry) for entry in self._index(field).range(low, high)]
+
+    def find_nearest(self, field: str, value: int, count: int = 5) -> list:
+        """Returns [value, group, name] for the count primates whose age or weight is closest to value."""
+        return [list(entry) for entry in self._index(field).nearest(value, count)]
 
     def get_group_list(self, group_name: str) -> str:
         """Returns all the members in the requested group, in a table format."""
@@ -166,6 +475,14 @@ class Enclosure():
         Returns primate object given the group name and primate name.
         Raises Exception error if invalid group is given.
         """
+        if self.cache is not None and group in self.groups:
+            # A spilled primate is restored. Nothing is spilled in turn, as the caller may go on to change
+            # the primate it is given, so the cache is trimmed later (see trim_cache())
+            members = getattr(self, f"{group}_list")
+            for i, member in enumerate(members):
+                if member.name.lower() == name:
+                    return self.cache.materialise(members, i)
+            return None
         if group == "chimpanzee":
             for primate in self.chimpanzee_list:
                 if primate.name.lower() == name:
@@ -191,6 +508,10 @@ class Enclosure():
 
     def set_name(self, group: str, primate_name: str, new_name: str):
         """Changes the name of the primate given a new name"""
+        previous = self._find(group, primate_name)
+        if previous is not None:
+            name, old_value = previous.name, previous.name
+        self._copy_on_write(group, primate_name)
         if group == "chimpanzee":
             for member in self.chimpanzee_list:
                 if member.name.lower() == primate_name:
@@ -211,9 +532,16 @@ class Enclosure():
             for member in self.gorilla_list:
                 if member.name.lower() == primate_name:
                     member.name = new_name
+        self.storage.update(group, primate_name, "name", new_name)
+        if previous is not None:
+            self._publish("changed", previous.group, name, "name", old_value, new_name)
 
     def set_age(self, group: str, primate_name: str, new_age: int):
         """Changes the name of the primate given a new name"""
+        previous = self._find(group, primate_name)
+        if previous is not None:
+            name, old_value = previous.name, previous.age
+        self._copy_on_write(group, primate_name)
         if group == "chimpanzee":
             for member in self.chimpanzee_list:
                 if member.name.lower() == primate_name:
@@ -234,9 +562,16 @@ class Enclosure():
             for member in self.gorilla_list:
                 if member.name.lower() == primate_name:
                     member.age = new_age
+        self.storage.update(group, primate_name, "age", new_age)
+        if previous is not None:
+            self._publish("changed", previous.group, name, "age", old_value, new_age)
 
     def set_weight(self, group: str, primate_name: str, new_weight: int):
         """Changes the name of the primate given a new name"""
+        previous = self._find(group, primate_name)
+        if previous is not None:
+            name, old_value = previous.name, previous.weight
+        self._copy_on_write(group, primate_name)
         if group == "chimpanzee":
             for member in self.chimpanzee_list:
                 if member.name.lower() == primate_name:
@@ -257,9 +592,16 @@ class Enclosure():
             for member in self.gorilla_list:
                 if member.name.lower() == primate_name:
                     member.weight = new_weight
+        self.storage.update(group, primate_name, "weight", new_weight)
+        if previous is not None:
+            self._publish("changed", previous.group, name, "weight", old_value, new_weight)
 
     def set_desc(self, group: str, primate_name: str, new_desc: str):
         """Changes the name of the primate given a new name"""
+        previous = self._find(group, primate_name)
+        if previous is not None:
+            name, old_value = previous.name, previous.description
+        self._copy_on_write(group, primate_name)
         if group == "chimpanzee":
             for member in self.chimpanzee_list:
                 if member.name.lower() == primate_name:
@@ -280,6 +622,9 @@ class Enclosure():
             for member in self.gorilla_list:
                 if member.name.lower() == primate_name:
                     member.description = new_desc
+        self.storage.update(group, primate_name, "description", new_desc)
+        if previous is not None:
+            self._publish("changed", previous.group, name, "description", old_value, new_desc)
 
 class Primate():
 
@@ -294,6 +639,10 @@ class Primate():
     def __str__(self):
         return f"Group: \t\t{self.group}\nName: \t\t{self.name}\nAge: \t\t{self.age}\nWeight: \t{self.weight}\nDescription: \t{self.description}\nHungry: \t{self.hungry}\n"
 
+    def to_row(self) -> list:
+        """Returns the primate as a storage row."""
+        return [self.group, self.name, self.age, self.weight, self.description, self.hungry]
+
     def get_description(self) -> str:
         """Returns a description of the primate."""
         return(f"\n{self.name} is a {self.age} year old, {self.weight}kg {self.group}. \n{self.description}\n")
@@ -304,13 +653,30 @@ class Primate():
         self.hungry = False
         return f"{self.name} ate the {food}.\n"
 
+    def reaction(self, count: int) -> int:
+        """Returns a random reaction number from 0 to count - 1, drawn from this primate's own random stream."""
+        return randomness.reaction(f"{self.group}:{self.name.lower()}", count)
+
     def wave(self) -> str:
         """Returns a string response."""
         return f"You waved at {self.name}.\n{self.name} waved back!\n"
 
     def take_photo(self) -> str:
-        """Returns a string response."""
-        return f"You took a photo of {self.name}.\n"
+        """
+        Writes the photo to the zoo_photo.txt file if there is one of this primate or its species, and
+        returns a string response. Without one, nothing is written and the response says so.
+        """
+        image = photos.photo_for(self)
+        if image is None:
+            return f"You took a photo of {self.name}.\n"
+        self.save_photo(image)
+        return "You took a photo! Take a look at it in the zoo_photo.txt file.\n"
+
+    def save_photo(self, image: str):
+        """Writes a picture to the zoo_photo.txt file."""
+        with open("zoo_photo.txt", "w", encoding="utf-8") as file:
+            file.write(f"Here is your photo of {self.name} at primate Paradise:\n")
+            file.write(image)
 
 class Chimpanzee(Primate):
 
@@ -322,7 +688,7 @@ class Chimpanzee(Primate):
     easter_egg = "Saves the photo to a zoo_photo.txt file"
 
     def __init__(self, name, age, weight, description, group="Chimpanzee", hungry=True):
-        super().__init__(name, age, weight, description, hungry)
+        super().__init__(name, age, weight, description, group, hungry)
         self.group = group
 
     def display_group_info(self) -> str:
@@ -330,10 +696,8 @@ class Chimpanzee(Primate):
         return f"Scientific Name: \t{self.scientific_name}\nPopulation: \t\t{self.population}\nEndangered Level: \t{self.endangered_level}\nHabitat: \t\t{self.habitat}\nFun Fact: \t\t{self.fact}\n"
 
     def take_photo(self) -> str:
-        """Writes a picture fo the zoo_photo.txt file and returns a string response."""
-        with open("zoo_photo.txt", "w", encoding="utf-8") as file:
-            file.write(f"Here is your photo of {self.name} at primate Paradise:\n")
-            file.write(chimp_image)
+        """Writes a picture fo the zoo_photo.txt file, the built in chimpanzee if there is no photo, and returns a string response."""
+        self.save_photo(photos.photo_for(self, fallback=chimp_image))
         return "You took a photo! Take a look at it in the zoo_photo.txt file.\n"
 
 class Orangutan(Primate):
@@ -346,7 +710,7 @@ class Orangutan(Primate):
     easter_egg = "If they are hungry, they'll steals your phone when you try to take a picture. They will return it for a banana."
 
     def __init__(self, name, age, weight, description, group="Orangutan", hungry=True, has_camera=False):
-        super().__init__(name, age, weight, description, hungry)
+        super().__init__(name, age, weight, description, group, hungry)
         self.group = group
         self.has_camera = has_camera
 
@@ -389,7 +753,7 @@ class Bonobo(Primate):
     easter_egg = "Displays a random reaction when you wave at them."
 
     def __init__(self, name, age, weight, description, group="Bonobo", hungry=True):
-        super().__init__(name, age, weight, description, hungry)
+        super().__init__(name, age, weight, description, group, hungry)
         self.group = group
 
     def display_group_info(self) -> str:
@@ -399,7 +763,7 @@ class Bonobo(Primate):
     def wave(self) -> str:
         """Returns a random string response."""
         action = ["smiled back", "waved back", "did a happy dance", "tapped on the glass",  "walked away"]
-        index = randint(0,(len(action)-1))
+        index = self.reaction(len(action))
         return f"You waved at {self.name}.\n{self.name} {action[index]}.\n"
 
 class Capuchin(Primate):
@@ -412,7 +776,7 @@ class Capuchin(Primate):
     easter_egg = "Picky with their food - they really like dates."
 
     def __init__(self, name, age, weight, description, group="Capuchin", hungry=True):
-        super().__init__(name, age, weight, description, hungry)
+        super().__init__(name, age, weight, description, group, hungry)
         self.group = group
 
     def display_group_info(self) -> str:
@@ -438,7 +802,7 @@ class Gorilla(Primate):
     easter_egg = "Beats their chest or lets out a roar when you wave at them."
 
     def __init__(self, name, age, weight, description, group="Gorilla", hungry=True):
-        super().__init__(name, age, weight, description, hungry)
+        super().__init__(name, age, weight, description, group, hungry)
         self.group = group
 
     def display_group_info(self) -> str:
@@ -448,12 +812,25 @@ class Gorilla(Primate):
     def wave(self) -> str:
         """Returns, at random, a string response and/or plays a sound."""
         action = ["let out a ROAR!", "beat his chest!", "waved back.", "tapped on the glass.",  "walked away."]
-        index = randint(0,(len(action)-1))
-        print(f"You waved at {self.name}.")
+        index = self.reaction(len(action))
         if index == 0:
-            playsound("sound_effects/gorilla_roar.mp3")
+            sound_player("sound_effects/gorilla_roar.mp3")
         elif index == 1:
-            playsound("sound_effects/beating_chest.wav")
+            sound_player("sound_effects/beating_chest.wav")
         else:
             pass
-        return f"{self.name} {action[index]}\n"
+        return f"You waved at {self.name}.\n{self.name} {action[index]}\n"
+
+def create_primate(group: str, name: str, age, weight, description: str, hungry=True) -> object:
+    """Returns a new instance of the respective primate class, or None if the group is unknown."""
+    # For each member of the primate group this will create the object as per its group
+    if group == "Chimpanzee":
+        return Chimpanzee(name, age, weight, description, hungry=hungry)
+    elif group == "Orangutan":
+        return Orangutan(name, age, weight, description, hungry=hungry)
+    elif group == "Bonobo":
+        return Bonobo(name, age, weight, description, hungry=hungry)
+    elif group == "Capuchin":
+        return Capuchin(name, age, weight, description, hungry=hungry)
+    elif group == "Gorilla":
+        return Gorilla(name, age, weight, description, hungry=hungry)
@@ -0,0 +1,86 @@
+"""
+Contains the seeded random streams used for primate reactions.
+
+Every primate draws from its own stream, derived from the service seed and the primate's group and
+name, so reactions are reproducible for a seed no matter how many other primates are waved at, or in
+which order. Each worker process of a simulation gets its own service from for_worker() so workers
+never share state. Reactions are generated in batches.
+
+Every stream draws its random bits from random.Random, so a seed gives the same reactions on every
+machine. NumPy, when it is installed, only speeds up turning a batch of bits into reaction numbers,
+and gives the same numbers as the plain Python version.
+"""
+
+import hashlib
+import random
+import struct
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class ReactionStream():
+    """An independent random stream that hands out reaction numbers, generated a batch at a time."""
+
+    def __init__(self, seed: int, batch_size: int = 256):
+        self.batch_size = batch_size
+        self.generator = random.Random(seed)
+        # Pending reactions for each number of choices, stored reversed so they can be popped
+        self.batches = {}
+
+    def _generate(self, count: int) -> list:
+        # Each reaction scales a 32 bit word down to 0 to count - 1
+        data = self.generator.getrandbits(32 * self.batch_size).to_bytes(4 * self.batch_size, "little")
+        if numpy is not None:
+            words = numpy.frombuffer(data, dtype="<u4").astype(numpy.uint64)
+            batch = ((words * count) >> 32).tolist()
+        else:
+            batch = [(word * count) >> 32 for word in struct.unpack(f"<{self.batch_size}I", data)]
+        batch.reverse()
+        return batch
+
+    def choice(self, count: int) -> int:
+        """Returns a random number from 0 to count - 1."""
+        batch = self.batches.get(count)
+        if not batch:
+            batch = self.batches[count] = self._generate(count)
+        return batch.pop()
+
+
+class RandomService():
+    """Hands out a separate, reproducible ReactionStream for each key."""
+
+    def __init__(self, seed: int = None):
+        self.seed = seed if seed is not None else random.SystemRandom().randrange(2**63)
+        self.streams = {}
+
+    def derive(self, key: str) -> int:
+        """Returns a seed for the given key, derived from the service seed."""
+        digest = hashlib.sha256(f"{self.seed}:{key}".encode("UTF-8")).digest()
+        return int.from_bytes(digest[:8], "big")
+
+    def stream(self, key: str) -> ReactionStream:
+        """Returns the stream for the given key, creating it on first use."""
+        if key not in self.streams:
+            self.streams[key] = ReactionStream(self.derive(key))
+        return self.streams[key]
+
+    def for_worker(self, worker: int) -> "RandomService":
+        """Returns a service for a worker process, independent of every other worker."""
+        return RandomService(self.derive(f"worker:{worker}"))
+
+
+service = RandomService()
+
+
+def seed(value: int = None):
+    """Replaces the shared service with one started from the given seed."""
+    global service
+    service = RandomService(value)
+
+
+def reaction(key: str, count: int) -> int:
+    """Returns a random reaction number from 0 to count - 1 from the stream for the given key."""
+    return service.stream(key).choice(count)
@@ -0,0 +1,100 @@
+"""
+Contains consoles for main.py that cut down the number of terminal writes, for use over slow links.
+
+BufferedIO collects everything printed for a screen and writes it together with the next prompt.
+DiffIO treats the output between two prompts as a screen and, using ANSI escape codes like curses
+does, only redraws the lines that differ from the previous screen.
+"""
+
+import shutil
+import sys
+from functools import lru_cache
+
+from session_io import ConsoleIO
+
+
+@lru_cache(maxsize=256)
+def split_lines(text: str) -> tuple:
+    """Splits a string into screen lines. The menus are constant strings, so they are only split once."""
+    return tuple(text.split("\n"))
+
+
+class BufferedIO(ConsoleIO):
+    """Buffers the output and writes each screen to the terminal in a single write."""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self.buffer = []
+
+    def print(self, *values, sep=" ", end="\n"):
+        self.buffer.append(sep.join(str(value) for value in values) + end)
+
+    def input(self, prompt: str = "") -> str:
+        self.buffer.append(prompt)
+        self.flush()
+        return input()
+
+    def flush(self):
+        """Writes the buffered output to the terminal."""
+        if self.buffer:
+            self.stream.write("".join(self.buffer))
+            self.stream.flush()
+            self.buffer = []
+
+
+class DiffIO(BufferedIO):
+    """Redraws only the lines of the screen that changed since the previous prompt."""
+
+    def __init__(self, stream=None):
+        super().__init__(stream)
+        self.screen = []
+
+    @staticmethod
+    def wraps(lines: list, columns: int) -> bool:
+        """Returns whether any of the lines is too wide to fit on one row of the terminal."""
+        return any(len(line) > columns for line in lines)
+
+    def render(self, chunks: list) -> str:
+        """Returns the escape codes and text needed to turn the previous screen into the new one."""
+        lines = [""]
+        for chunk in chunks:
+            first, *rest = split_lines(chunk)
+            lines[-1] += first
+            lines += rest
+        columns, rows = shutil.get_terminal_size()
+
+        # The first screen clears the terminal, and screens that fill it scroll when the answer is entered,
+        # so they can't be patched in place.
+        # A line wider than the terminal wraps onto the next row and moves every row below it, so the
+        # rows no longer match the lines and the screen is redrawn too
+        if not self.screen or len(lines) >= rows or len(self.screen) >= rows or self.wraps(lines, columns) or self.wraps(self.screen, columns):
+            self.screen = lines
+            return "\x1b[H\x1b[2J" + "".join(chunks)
+
+        output = []
+        for row, line in enumerate(lines, start=1):
+            if row > len(self.screen) or self.screen[row - 1] != line:
+                output.append(f"\x1b[{row};1H{line}\x1b[K")
+        if len(lines) < len(self.screen):
+            output.append(f"\x1b[{len(lines) + 1};1H\x1b[J")
+        # Leaves the cursor at the end of the prompt
+        output.append(f"\x1b[{len(lines)};{len(lines[-1]) + 1}H")
+        self.screen = lines
+        return "".join(output)
+
+    def input(self, prompt: str = "") -> str:
+        self.buffer.append(prompt)
+        self.stream.write(self.render(self.buffer))
+        self.stream.flush()
+        self.buffer = []
+        answer = input()
+        # The answer is echoed after the prompt, so that line now differs from what was drawn
+        self.screen[-1] += answer
+        return answer
+
+    def flush(self):
+        """Writes the output left over after the last prompt below the current screen."""
+        if self.buffer:
+            self.stream.write(f"\x1b[{len(self.screen) + 1};1H" + "".join(self.buffer))
+            self.stream.flush()
+            self.buffer = []
@@ -0,0 +1,165 @@
+"""
+Records sessions of the Primate Paradise program and replays them as performance regression tests.
+
+Record a session (the roster it starts with is stored in the session file):
+    python replay.py record sessions/staff_update.jsonl enclosure.txt
+
+Replay every session in a directory, in parallel, comparing the timings with an earlier run:
+    python replay.py replay sessions/ --jobs 4 --baseline timings.json
+    python replay.py replay sessions/ --save timings.json
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import feeding
+import main as zoo
+import randomness
+from admission import AdmissionController
+from primate_classes import Enclosure
+from session_io import RecordingIO, ReplayIO, ReplayExhausted
+from storage import open_storage, TextFileStorage
+
+
+def record_session(session_path: str, roster: str = "enclosure.txt"):
+    """Runs the program in the terminal and records the session to session_path."""
+    zoo.enclosure = Enclosure(open_storage(roster))
+    zoo.enclosure.load_members()
+    rows = [primate.to_row() for primate in zoo.enclosure.enclosure_list]
+    limits = {"action_rate": zoo.admission.action_rate, "action_burst": zoo.admission.action_burst}
+    stock = {"stock": feeding.load_stock(), "last_round": feeding.last_round(), "day": feeding.today()}
+    zoo.console = RecordingIO(session_path, rows, randomness.service.seed, limits, stock)
+    try:
+        zoo.main()
+    finally:
+        zoo.console.close()
+
+
+def replay_session(session_path: str) -> dict:
+    """Replays a recorded session at full speed against a copy of its roster and returns the results."""
+    with open(session_path, "r", encoding="UTF-8") as file:
+        header = json.loads(file.readline())
+        steps = [json.loads(line) for line in file]
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Saves made during the replay go to a throwaway copy of the roster
+        storage = TextFileStorage(os.path.join(directory, "enclosure.txt"))
+        storage.save(header["rows"])
+        zoo.enclosure = Enclosure(storage)
+        zoo.enclosure.load_members()
+        # Feeding rounds use a copy of the stock the session started with, on the day it was recorded.
+        # Sessions recorded without it start with an empty stock
+        feeding.stock_path = os.path.join(directory, "food_stock.json")
+        if header.get("stock"):
+            feeding.save_stock(header["stock"]["stock"], day=header["stock"]["last_round"])
+            day = datetime.date.fromisoformat(header["stock"]["day"])
+            feeding.clock = lambda: day
+        else:
+            feeding.clock = datetime.date.today
+        zoo.console = ReplayIO(steps)
+        # Replays run at full speed, so the visitor's actions are limited by the times they were recorded at.
+        # Sessions recorded without them are replayed without a limit
+        if header.get("admission"):
+            zoo.admission = AdmissionController(**header["admission"], clock=zoo.console.clock)
+        else:
+            zoo.admission = AdmissionController(action_burst=10**9)
+        # Primates react the same way they did when the session was recorded
+        randomness.seed(header.get("seed"))
+
+        error = None
+        start = time.perf_counter()
+        try:
+            zoo.main()
+        except ReplayExhausted as exception:
+            error = str(exception)
+        total = time.perf_counter() - start
+        zoo.console.finish()
+
+    return {
+        "session": session_path,
+        "total": total,
+        "steps": zoo.console.timings,
+        "mismatches": zoo.console.mismatches,
+        "error": error,
+    }
+
+
+def find_sessions(paths: list) -> list:
+    """Returns the session files in the given files and directories."""
+    sessions = []
+    for path in paths:
+        if os.path.isdir(path):
+            sessions += sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(".jsonl"))
+        else:
+            sessions.append(path)
+    return sessions
+
+
+def replay_all(paths: list, jobs: int = None) -> list:
+    """Replays every session in parallel, one process per worker, and returns their results."""
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(replay_session, find_sessions(paths)))
+
+
+def report(results: list, baseline: dict = None, tolerance: float = 1.5) -> bool:
+    """Prints a line per session and returns True if every session passed."""
+    passed = True
+    for result in results:
+        problems = []
+        if result["error"]:
+            problems.append(result["error"])
+        if result["mismatches"]:
+            problems.append(f"{len(result['mismatches'])} step(s) printed unexpected output")
+        expected = (baseline or {}).get(result["session"])
+        if expected is not None and result["total"] > expected * tolerance:
+            problems.append(f"slower than baseline ({expected * 1000:.2f}ms)")
+
+        slowest = max(result["steps"], default=0)
+        status = "FAIL" if problems else "PASS"
+        print(f"{status} {result['session']}: {result['total'] * 1000:.2f}ms over {len(result['steps'])} steps, slowest step {slowest * 1000:.2f}ms")
+        for problem in problems:
+            print(f"     {problem}")
+        passed = passed and not problems
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and replay Primate Paradise sessions.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record = commands.add_parser("record", help="record a session from the terminal")
+    record.add_argument("session")
+    record.add_argument("roster", nargs="?", default="enclosure.txt")
+
+    replay = commands.add_parser("replay", help="replay recorded sessions")
+    replay.add_argument("paths", nargs="+", help="session files or directories of .jsonl sessions")
+    replay.add_argument("--jobs", type=int, default=None, help="number of worker processes")
+    replay.add_argument("--baseline", help="timings file from an earlier run to compare against")
+    replay.add_argument("--tolerance", type=float, default=1.5, help="allowed slowdown over the baseline")
+    replay.add_argument("--save", help="write the timings of this run to a file")
+
+    args = parser.parse_args()
+    if args.command == "record":
+        record_session(args.session, args.roster)
+        return
+
+    results = replay_all(args.paths, args.jobs)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="UTF-8") as file:
+            baseline = json.load(file)
+    passed = report(results, baseline, args.tolerance)
+    if args.save:
+        with open(args.save, "w", encoding="UTF-8") as file:
+            json.dump({result["session"]: result["total"] for result in results}, file, indent=2)
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
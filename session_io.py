@@ -0,0 +1,121 @@
+"""
+Contains the console classes used by main.py to read input and print output.
+
+ConsoleIO talks to the terminal, RecordingIO also writes every step of the session to a file and
+ReplayIO feeds a recorded session back in, checking the output and timing each step.
+A step is everything printed since the previous input, the prompt, and the answer given to it.
+Each step also records the time its answer was given, so a replay can rate limit the visitor's
+actions as they were limited when recording. Sound effects are played through the console too, so a recording notes each one as a line of its
+output and a replay checks them without playing anything.
+"""
+
+import json
+import time
+
+from playsound import playsound
+
+
+class ConsoleIO():
+    """Reads from and prints to the terminal."""
+
+    def input(self, prompt: str = "") -> str:
+        return input(prompt)
+
+    def print(self, *values, sep=" ", end="\n"):
+        print(*values, sep=sep, end=end)
+
+    def play(self, path: str):
+        """Plays a sound effect, returning when it has finished."""
+        playsound(path)
+
+    def flush(self):
+        """Nothing to do, the output is printed straight away."""
+
+
+class RecordingIO(ConsoleIO):
+    """Behaves like ConsoleIO and appends every step of the session to a JSON lines file."""
+
+    def __init__(self, path: str, rows: list = None, seed: int = None, admission: dict = None, stock: dict = None):
+        self.file = open(path, "w", encoding="UTF-8")
+        self.output = []
+        # The first line holds the roster, random seed, action limits and food stock the session started with so it can be replayed as is
+        self._write({"rows": rows or [], "seed": seed, "admission": admission, "stock": stock})
+
+    def _write(self, record: dict):
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    def input(self, prompt: str = "") -> str:
+        answer = super().input(prompt)
+        self._write({"output": "".join(self.output), "prompt": prompt, "input": answer, "time": time.monotonic()})
+        self.output = []
+        return answer
+
+    def print(self, *values, sep=" ", end="\n"):
+        super().print(*values, sep=sep, end=end)
+        self.output.append(sep.join(str(value) for value in values) + end)
+
+    def play(self, path: str):
+        super().play(path)
+        self.output.append(f"[sound: {path}]\n")
+
+    def close(self):
+        """Writes whatever was printed after the last input and closes the file."""
+        self._write({"output": "".join(self.output), "prompt": None, "input": None})
+        self.file.close()
+
+
+class ReplayExhausted(Exception):
+    """Raised when the program asks for more input than the recorded session holds."""
+
+
+class ReplayIO(ConsoleIO):
+    """Answers prompts from a recorded session without printing anything, checking the output and timing each step."""
+
+    def __init__(self, steps: list):
+        self.steps = steps
+        self.position = 0
+        self.output = []
+        self.mismatches = []
+        self.timings = []
+        self._started = time.perf_counter()
+        # The recorded time of the last answer given
+        self.now = 0.0
+
+    def _check(self, step: dict, prompt):
+        """Compares the output and prompt of the current step with the recording."""
+        now = time.perf_counter()
+        self.timings.append(now - self._started)
+        output = "".join(self.output)
+        if output != step["output"] or prompt != step["prompt"]:
+            self.mismatches.append({"step": self.position, "expected": step["output"], "actual": output})
+        self.output = []
+
+    def input(self, prompt: str = "") -> str:
+        if self.position >= len(self.steps) or self.steps[self.position]["input"] is None:
+            raise ReplayExhausted(f"The session asked for input at step {self.position}, but the recording has ended.")
+        step = self.steps[self.position]
+        self._check(step, prompt)
+        self.position += 1
+        self.now = step.get("time", self.now)
+        self._started = time.perf_counter()
+        return step["input"]
+
+    def clock(self) -> float:
+        """Returns the time the session had reached when it was recorded, for the visitor's action limits."""
+        return self.now
+
+    def print(self, *values, sep=" ", end="\n"):
+        self.output.append(sep.join(str(value) for value in values) + end)
+
+    def play(self, path: str):
+        """Notes the sound in the output without playing it."""
+        self.output.append(f"[sound: {path}]\n")
+
+    def finish(self):
+        """Checks the output printed after the last input and that every recorded input was used."""
+        if self.position < len(self.steps) and self.steps[self.position]["input"] is None:
+            self._check(self.steps[self.position], None)
+            self.position += 1
+        elif self.position < len(self.steps):
+            self.mismatches.append({"step": self.position, "expected": "more input", "actual": "the session ended"})
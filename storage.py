@@ -0,0 +1,295 @@
+"""
+Contains the storage backends used by the Enclosure to persist its members.
+
+Every backend stores a member as a row: [group, name, age, weight, description, hungry].
+load() returns every row, and stream() yields them as they are read so a large roster can be
+loaded without holding all its rows at once. A backend that can read a single row without reading
+the rest (keyed = True) also has get(), which the primate cache uses to restore spilled primates.
+The add/remove/update calls are made as the roster changes and commit() is called by
+Enclosure.save_members(), so a backend can either write each change as it happens or
+rewrite everything on commit.
+
+To migrate an existing roster into SQLite or a compressed block file:
+    python storage.py migrate enclosure.txt enclosure.db
+    python storage.py migrate enclosure.txt enclosure.pack
+"""
+
+import bisect
+import json
+import lzma
+import os
+import sqlite3
+import struct
+import sys
+import zlib
+
+
+class TextFileStorage():
+    """Stores the members as semicolon separated lines in a text file. Every commit rewrites the file."""
+
+    keyed = False
+
+    def __init__(self, path="enclosure.txt"):
+        self.path = path
+
+    def load(self) -> list:
+        """Returns all the rows in the file."""
+        return list(self.stream())
+
+    def stream(self):
+        """Yields the rows in the file, one line at a time."""
+        with open(self.path, "r", encoding="UTF-8") as file:
+            for line in file:
+                yield line.strip().split(";")
+
+    def save(self, rows):
+        """Replaces the contents of the file with the given rows."""
+        # Written to a new file that replaces the old one, so other programs never read half a roster
+        temporary = self.path + ".tmp"
+        with open(temporary, "w", encoding="UTF-8") as file:
+            for row in rows:
+                file.write(";".join(str(value) for value in row) + "\n")
+        os.replace(temporary, self.path)
+
+    def add(self, row: list):
+        """Nothing to do, the row is written on the next commit."""
+
+    def remove(self, group: str, primate_name: str):
+        """Nothing to do, the row is dropped on the next commit."""
+
+    def update(self, group: str, primate_name: str, field: str, value):
+        """Nothing to do, the change is written on the next commit."""
+
+    def commit(self, rows):
+        """Writes the whole roster to the file."""
+        self.save(rows)
+
+    def rollback(self):
+        """Nothing to do, nothing is written before a commit."""
+
+
+class SQLiteStorage():
+    """
+    Stores the members in a SQLite database. Each add, remove and update is a single row statement,
+    and commit() only has to commit the open database transaction.
+
+    The connection is shared by every thread that uses the enclosure, such as the roster watcher and
+    the sync server, which take the enclosure's lock around each use.
+    """
+
+    keyed = False
+    # Only these statements are ever run, so sqlite3 prepares each of them once and reuses it
+    create_table = """CREATE TABLE IF NOT EXISTS primates (
+        group_name TEXT NOT NULL,
+        name TEXT NOT NULL,
+        age INTEGER NOT NULL,
+        weight INTEGER NOT NULL,
+        description TEXT NOT NULL,
+        hungry TEXT NOT NULL)"""
+    create_indexes = [
+        "CREATE INDEX IF NOT EXISTS primates_group ON primates (group_name)",
+        "CREATE INDEX IF NOT EXISTS primates_name ON primates (lower(name))",
+    ]
+    select_all = "SELECT group_name, name, age, weight, description, hungry FROM primates ORDER BY rowid"
+    insert_row = "INSERT INTO primates (group_name, name, age, weight, description, hungry) VALUES (?, ?, ?, ?, ?, ?)"
+    delete_row = "DELETE FROM primates WHERE group_name = ? AND lower(name) = ?"
+    delete_all = "DELETE FROM primates"
+    update_field = {
+        field: f"UPDATE primates SET {field} = ? WHERE group_name = ? AND lower(name) = ?"
+        for field in ["name", "age", "weight", "description", "hungry"]
+    }
+
+    def __init__(self, path="enclosure.db"):
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(self.create_table)
+        for statement in self.create_indexes:
+            self.connection.execute(statement)
+        self.connection.commit()
+
+    def load(self) -> list:
+        """Returns all the rows in the database, in the order they were added."""
+        return list(self.stream())
+
+    def stream(self):
+        """Yields the rows in the database, in the order they were added, as they are fetched."""
+        for row in self.connection.execute(self.select_all):
+            yield [str(value) for value in row]
+
+    def save(self, rows):
+        """Replaces the contents of the database with the given rows."""
+        self.connection.execute(self.delete_all)
+        self.connection.executemany(self.insert_row, ([str(value) for value in row] for row in rows))
+        self.connection.commit()
+
+    def add(self, row: list):
+        """Inserts a single row."""
+        self.connection.execute(self.insert_row, [str(value) for value in row])
+
+    def remove(self, group: str, primate_name: str):
+        """Deletes the row of the named primate."""
+        self.connection.execute(self.delete_row, (group.capitalize(), primate_name.lower()))
+
+    def update(self, group: str, primate_name: str, field: str, value):
+        """Updates a single field of the named primate."""
+        if field not in self.update_field:
+            raise Exception("Invalid field selected.")
+        self.connection.execute(self.update_field[field], (str(value), group.capitalize(), primate_name.lower()))
+
+    def commit(self, rows):
+        """Commits the changes made since the last commit. The rows are already in the database."""
+        self.connection.commit()
+
+    def rollback(self):
+        """Discards the changes made since the last commit."""
+        self.connection.rollback()
+
+    def close(self):
+        self.connection.close()
+
+
+class BlockStorage():
+    """
+    Stores the members in a file of independently compressed blocks, followed by a block index.
+
+    The rows are sorted by group and name and split into blocks of block_size rows. The index holds
+    the offset, length and first key of each block, so get() only has to decompress the one block
+    that can hold a primate, and stream() decompresses a block at a time. Every commit rewrites the file.
+
+    Layout: magic, codec, blocks..., compressed JSON index, index offset (8 bytes).
+    """
+
+    magic = b"PRIMATES"
+    codecs = {
+        b"z": (zlib.compress, zlib.decompress),
+        b"x": (lzma.compress, lzma.decompress),
+    }
+    field_separator = "\x1f"
+    keyed = True
+
+    def __init__(self, path="enclosure.pack", codec="zlib", block_size=256):
+        self.path = path
+        self.codec = b"x" if codec == "lzma" else b"z"
+        self.block_size = block_size
+        # (file signature, codec, block index, first key of each block), kept until the file changes
+        self._index = None
+        # ((file signature, block number), rows by key) of the last block get() read
+        self._block = None
+
+    @staticmethod
+    def key(row: list) -> str:
+        return f"{row[0].lower()}\x00{row[1].lower()}"
+
+    def _read_index(self, file) -> tuple:
+        """Returns the codec and block index of the open file."""
+        header = file.read(len(self.magic) + 1)
+        if header[:len(self.magic)] != self.magic:
+            raise Exception(f"{self.path} is not a roster block file.")
+        codec = header[len(self.magic):]
+        file.seek(-8, os.SEEK_END)
+        (offset,) = struct.unpack(">Q", file.read(8))
+        file.seek(offset)
+        data = file.read()[:-8]
+        return codec, json.loads(self.codecs[codec][1](data))
+
+    def _read_block(self, file, codec: bytes, entry: list) -> list:
+        offset, length = entry[0], entry[1]
+        file.seek(offset)
+        text = self.codecs[codec][1](file.read(length)).decode("UTF-8")
+        return [line.split(self.field_separator) for line in text.split("\n")]
+
+    def load(self) -> list:
+        """Returns all the rows in the file."""
+        return list(self.stream())
+
+    def stream(self):
+        """Yields the rows in the file, decompressing one block at a time."""
+        with open(self.path, "rb") as file:
+            codec, index = self._read_index(file)
+            for entry in index:
+                yield from self._read_block(file, codec, entry)
+
+    def get(self, group: str, primate_name: str) -> list:
+        """Returns the row of the named primate, or None if there isn't one. Only one block is decompressed."""
+        stat = os.stat(self.path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        wanted = f"{group.lower()}\x00{primate_name.lower()}"
+        if self._index is None or self._index[0] != signature:
+            with open(self.path, "rb") as file:
+                codec, index = self._read_index(file)
+            self._index = (signature, codec, index, [entry[2] for entry in index])
+        _, codec, index, first_keys = self._index
+
+        position = bisect.bisect_right(first_keys, wanted) - 1
+        if position < 0:
+            return None
+        # Rows are usually wanted in roster order, so the last block read is kept by key
+        if self._block is None or self._block[0] != (signature, position):
+            with open(self.path, "rb") as file:
+                rows = {self.key(row): row for row in self._read_block(file, codec, index[position])}
+            self._block = ((signature, position), rows)
+        return self._block[1].get(wanted)
+
+    def save(self, rows):
+        """Replaces the contents of the file with the given rows."""
+        rows = sorted(([str(value) for value in row] for row in rows), key=self.key)
+        compress = self.codecs[self.codec][0]
+        index = []
+        temporary = self.path + ".tmp"
+        with open(temporary, "wb") as file:
+            file.write(self.magic + self.codec)
+            for start in range(0, len(rows), self.block_size):
+                block = rows[start:start + self.block_size]
+                data = compress("\n".join(self.field_separator.join(row) for row in block).encode("UTF-8"))
+                index.append([file.tell(), len(data), self.key(block[0])])
+                file.write(data)
+            offset = file.tell()
+            file.write(compress(json.dumps(index).encode("UTF-8")))
+            file.write(struct.pack(">Q", offset))
+        os.replace(temporary, self.path)
+        self._index = None
+        self._block = None
+
+    def add(self, row: list):
+        """Nothing to do, the row is written on the next commit."""
+
+    def remove(self, group: str, primate_name: str):
+        """Nothing to do, the row is dropped on the next commit."""
+
+    def update(self, group: str, primate_name: str, field: str, value):
+        """Nothing to do, the change is written on the next commit."""
+
+    def commit(self, rows):
+        """Writes the whole roster to the file."""
+        self.save(rows)
+
+    def rollback(self):
+        """Nothing to do, nothing is written before a commit."""
+
+
+def open_storage(path: str):
+    """Returns the storage backend for the given file, chosen by its extension."""
+    if path.endswith((".db", ".sqlite", ".sqlite3")):
+        return SQLiteStorage(path)
+    if path.endswith(".pack"):
+        return BlockStorage(path)
+    if path.endswith(".xpack"):
+        return BlockStorage(path, codec="lzma")
+    return TextFileStorage(path)
+
+
+def migrate(source: str, destination: str) -> int:
+    """Copies every row from one roster file to another and returns the number of rows copied."""
+    rows = list(open_storage(source).load())
+    open_storage(destination).save(rows)
+    return len(rows)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "migrate":
+        print("Usage: python storage.py migrate <source> <destination>")
+        sys.exit(1)
+    total = migrate(sys.argv[2], sys.argv[3])
+    print(f"Migrated {total} primates from {sys.argv[2]} to {sys.argv[3]}.")
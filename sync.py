@@ -0,0 +1,238 @@
+"""
+Synchronises the rosters of two sites by exchanging only the records that differ.
+
+Each record is hashed and the records are spread over buckets by key. The two sides first compare
+one digest per bucket, then the record hashes of the buckets that differ, and finally send each
+other the changed records, which are applied as add/remove/set operations on the Enclosure with
+one save. The state both sides agreed on is kept in a state file, so a record changed on both
+sides since the last sync is reported as a conflict and left alone.
+
+    python sync.py sync enclosure.txt backup/enclosure.txt
+    python sync.py serve backup/enclosure.txt --port 8900
+    python sync.py sync enclosure.txt tcp://127.0.0.1:8900
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import socket
+import socketserver
+
+from primate_classes import Enclosure, create_primate
+from storage import open_storage
+
+bucket_count = 256
+
+
+def record_key(row: list) -> str:
+    return f"{str(row[0]).lower()}\x00{str(row[1]).lower()}"
+
+
+def record_hash(row: list) -> str:
+    """Returns the hash of a record. Hunger isn't part of the roster, so it isn't compared."""
+    return hashlib.sha256("\x1f".join(str(value) for value in row[:5]).encode("UTF-8")).hexdigest()[:32]
+
+
+def bucket_of(key: str) -> int:
+    return hashlib.sha256(key.encode("UTF-8")).digest()[0] % bucket_count
+
+
+class LocalStore():
+    """A roster file on this machine, loaded into an Enclosure."""
+
+    def __init__(self, path: str):
+        self.enclosure = Enclosure(open_storage(path))
+        self.enclosure.load_members()
+
+    def _hashes(self) -> dict:
+        return {record_key(row): record_hash(row) for row in (primate.to_row() for primate in self.enclosure.enclosure_list)}
+
+    def bucket_digests(self) -> list:
+        """Returns a short digest of the record hashes in each bucket."""
+        buckets = [[] for _ in range(bucket_count)]
+        for key, value in sorted(self._hashes().items()):
+            buckets[bucket_of(key)].append(f"{key}:{value}")
+        return [hashlib.sha256("\n".join(bucket).encode("UTF-8")).hexdigest()[:16] for bucket in buckets]
+
+    def record_hashes(self, buckets: list) -> dict:
+        """Returns the record hashes in the given buckets."""
+        buckets = set(buckets)
+        return {key: value for key, value in self._hashes().items() if bucket_of(key) in buckets}
+
+    def get_rows(self, keys: list) -> dict:
+        """Returns the records with the given keys."""
+        keys = set(keys)
+        rows = {}
+        for primate in self.enclosure.enclosure_list:
+            row = primate.to_row()
+            if record_key(row) in keys:
+                rows[record_key(row)] = [str(value) for value in row]
+        return rows
+
+    def apply(self, rows: dict, deletes: list):
+        """Adds or updates the given records and removes the deleted ones, saving once."""
+        with self.enclosure.transaction():
+            for key in deletes:
+                group, name = key.split("\x00")
+                self.enclosure.remove_primate(group, name)
+            for key, row in rows.items():
+                group, name = key.split("\x00")
+                primate = self.enclosure.get_primate(group, name)
+                if primate is None:
+                    self.enclosure.add_primate(create_primate(*row[:5]))
+                    continue
+                if primate.name != row[1]:
+                    self.enclosure.set_name(group, name, row[1])
+                if str(primate.age) != row[2]:
+                    self.enclosure.set_age(group, name, int(row[2]))
+                if str(primate.weight) != row[3]:
+                    self.enclosure.set_weight(group, name, int(row[3]))
+                if primate.description != row[4]:
+                    self.enclosure.set_desc(group, name, row[4])
+
+
+class RemoteStore():
+    """A roster served by 'python sync.py serve' on another machine, with the same methods as LocalStore."""
+
+    def __init__(self, host: str, port: int):
+        self.connection = socket.create_connection((host, port))
+        self.file = self.connection.makefile("rwb")
+        self.sent = 0
+        self.received = 0
+
+    def _call(self, method: str, *args):
+        request = json.dumps({"method": method, "args": args}).encode("UTF-8") + b"\n"
+        self.file.write(request)
+        self.file.flush()
+        response = self.file.readline()
+        self.sent += len(request)
+        self.received += len(response)
+        result = json.loads(response)
+        if "error" in result:
+            raise Exception(result["error"])
+        return result["result"]
+
+    def bucket_digests(self) -> list:
+        return self._call("bucket_digests")
+
+    def record_hashes(self, buckets: list) -> dict:
+        return self._call("record_hashes", buckets)
+
+    def get_rows(self, keys: list) -> dict:
+        return self._call("get_rows", keys)
+
+    def apply(self, rows: dict, deletes: list):
+        return self._call("apply", rows, deletes)
+
+    def close(self):
+        self.file.close()
+        self.connection.close()
+
+
+class SyncHandler(socketserver.StreamRequestHandler):
+    """Answers the JSON line requests of a RemoteStore."""
+
+    methods = ["bucket_digests", "record_hashes", "get_rows", "apply"]
+
+    def handle(self):
+        for line in self.rfile:
+            request = json.loads(line)
+            try:
+                if request["method"] not in self.methods:
+                    raise Exception("Unknown method.")
+                with self.server.store.enclosure.lock:
+                    result = {"result": getattr(self.server.store, request["method"])(*request["args"])}
+            except Exception as error:
+                result = {"error": str(error)}
+            self.wfile.write(json.dumps(result).encode("UTF-8") + b"\n")
+
+
+def load_state(path: str) -> dict:
+    """Returns the record hashes both sides agreed on at the last sync."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="UTF-8") as file:
+        return json.load(file)
+
+
+def synchronise(local: LocalStore, remote, state_path: str) -> dict:
+    """
+    Brings the local and remote rosters in line and returns what was done: the keys pulled from
+    the remote side, pushed to it, and the conflicts that were left for staff to resolve.
+    """
+    base = load_state(state_path)
+    local_digests = local.bucket_digests()
+    remote_digests = remote.bucket_digests()
+    changed = [bucket for bucket in range(bucket_count) if local_digests[bucket] != remote_digests[bucket]]
+
+    local_hashes = local.record_hashes(changed) if changed else {}
+    remote_hashes = remote.record_hashes(changed) if changed else {}
+
+    pull, push, conflicts = [], [], []
+    for key in sorted(set(local_hashes) | set(remote_hashes)):
+        mine, theirs, agreed = local_hashes.get(key), remote_hashes.get(key), base.get(key)
+        if mine == theirs:
+            continue
+        if mine == agreed:
+            pull.append(key)
+        elif theirs == agreed:
+            push.append(key)
+        else:
+            conflicts.append(key)
+
+    # Records missing on a side are deleted there, the rest are sent as rows
+    pull_rows = remote.get_rows([key for key in pull if remote_hashes.get(key)]) if pull else {}
+    push_rows = local.get_rows([key for key in push if local_hashes.get(key)]) if push else {}
+    if pull:
+        local.apply(pull_rows, [key for key in pull if not remote_hashes.get(key)])
+    if push:
+        remote.apply(push_rows, [key for key in push if not local_hashes.get(key)])
+
+    # Conflicting records keep the state of the last sync so they are reported again next time
+    state = local.record_hashes(range(bucket_count))
+    for key in conflicts:
+        if key in base:
+            state[key] = base[key]
+        else:
+            state.pop(key, None)
+    with open(state_path, "w", encoding="UTF-8") as file:
+        json.dump(state, file)
+
+    return {"pulled": pull, "pushed": push, "conflicts": conflicts}
+
+
+def open_store(location: str):
+    """Returns a RemoteStore for a tcp://host:port location and a LocalStore for a file."""
+    if location.startswith("tcp://"):
+        host, port = location[len("tcp://"):].rsplit(":", 1)
+        return RemoteStore(host, int(port))
+    return LocalStore(location)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synchronise Primate Paradise rosters between sites.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    sync = commands.add_parser("sync", help="synchronise a local roster with another roster or a peer")
+    sync.add_argument("local")
+    sync.add_argument("remote", help="another roster file or tcp://host:port")
+    sync.add_argument("--state", help="file for the state of the last sync, next to the local roster by default")
+    serve = commands.add_parser("serve", help="serve a roster to peers")
+    serve.add_argument("roster")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8900)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = socketserver.ThreadingTCPServer((args.host, args.port), SyncHandler)
+        server.store = LocalStore(args.roster)
+        print(f"Serving {args.roster} on {args.host}:{args.port}")
+        server.serve_forever()
+    else:
+        remote_name = args.remote.replace("://", "_").replace(":", "_").replace("/", "_")
+        state_path = args.state or f"{args.local}.{remote_name}.sync.json"
+        result = synchronise(LocalStore(args.local), open_store(args.remote), state_path)
+        print(f"Pulled {len(result['pulled'])} and pushed {len(result['pushed'])} records.")
+        for key in result["conflicts"]:
+            group, name = key.split("\x00")
+            print(f"Conflict: {name} ({group}) was changed on both sides and has been left as it is.")
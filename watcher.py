@@ -0,0 +1,151 @@
+"""
+Watches the roster file for changes made by other programs and merges them into the Enclosure.
+
+The watcher runs in a background thread so the menus carry on while it works. It wakes up on
+inotify events where they are available (Linux) and otherwise polls the file's inode, modification
+time and size every interval seconds, along with those of a SQLite database's -wal file. When the
+file has changed it is read again and only the members that differ are added, removed or updated in
+memory, through the Enclosure so that change events, indexes and caches follow along.
+
+A program may still be writing the file when it is seen to change, so a change is only merged
+once the file has stayed the same for a whole check, and a read that comes back empty or with a
+malformed row is skipped until the next change. Otherwise a half written file would remove every
+primate that hadn't been written yet.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import threading
+
+# inotify event masks, from <sys/inotify.h>
+IN_MODIFY = 0x2
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+
+
+def inotify_watch(directory: str) -> int:
+    """Returns an inotify file descriptor watching the directory, or None if inotify isn't available."""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        descriptor = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if descriptor < 0:
+        return None
+    # The directory is watched, as editors often save by writing a new file and renaming it
+    mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+    if libc.inotify_add_watch(descriptor, os.fsencode(directory), mask) < 0:
+        os.close(descriptor)
+        return None
+    return descriptor
+
+
+def valid_rows(rows: list) -> bool:
+    """Returns whether every row is a whole storage row: a known group, a name, a whole age and weight, and hunger."""
+    groups = ["Chimpanzee", "Orangutan", "Bonobo", "Capuchin", "Gorilla"]
+    for row in rows:
+        if len(row) != 6 or row[0] not in groups or not row[1]:
+            return False
+        if not row[2].isdigit() or not row[3].isdigit() or row[5] not in ["True", "False"]:
+            return False
+    return True
+
+
+class RosterWatcher():
+    """Merges changes made to the roster file by other programs into the enclosure."""
+
+    def __init__(self, enclosure, path: str, interval: float = 1.0):
+        self.enclosure = enclosure
+        self.path = path
+        self.interval = interval
+        self.known = self.signature()
+        # The changed signature seen at the last check, merged if it is still the same at the next one
+        self.pending = None
+        self._stop = threading.Event()
+        self._thread = None
+        # After the enclosure saves, the new file is ours and doesn't need merging
+        enclosure.subscribe(self._saved, batch=True)
+
+    def signature(self) -> tuple:
+        """
+        Returns the inode, modification time and size of the file, and of its SQLite write-ahead log
+        if it has one, or None if the file doesn't exist.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        # A SQLite database is changed in its -wal file until the log is checkpointed into the database
+        try:
+            log = os.stat(f"{self.path}-wal")
+            log = (log.st_ino, log.st_mtime_ns, log.st_size)
+        except FileNotFoundError:
+            log = None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size, log)
+
+    def _saved(self, events: list):
+        self.known = self.signature()
+
+    def check(self) -> int:
+        """
+        Merges the file into the enclosure if it has changed and stayed the same since the previous
+        check, and returns the number of changes.
+        """
+        signature = self.signature()
+        if signature == self.known or signature is None:
+            self.pending = None
+            return 0
+        if signature != self.pending:
+            # The file may still be being written, so it is merged at the next check if it has settled
+            self.pending = signature
+            return 0
+        with self.enclosure.lock:
+            # Staff are part way through a change, so the merge waits for the next check
+            if self.enclosure.in_transaction():
+                return 0
+            rows = [[str(value) for value in row] for row in self.enclosure.storage.load()]
+            # The file changed again while it was read, so it is read again once it settles
+            if self.signature() != signature:
+                return 0
+            # A file that is empty or not a whole roster is skipped until it changes again
+            if not rows or not valid_rows(rows):
+                self.known = signature
+                self.pending = None
+                return 0
+            changes = self.enclosure.merge_rows(rows)
+            self.known = signature
+            self.pending = None
+        return changes
+
+    def _run(self):
+        descriptor = inotify_watch(os.path.dirname(os.path.abspath(self.path)))
+        try:
+            while not self._stop.is_set():
+                if descriptor is None:
+                    self._stop.wait(self.interval)
+                else:
+                    ready, _, _ = select.select([descriptor], [], [], self.interval)
+                    if ready:
+                        os.read(descriptor, 65536)
+                try:
+                    self.check()
+                except Exception:
+                    # The file couldn't be read as a roster, such as a block file part way through
+                    # being written, so it is read again on the next check rather than stopping the watcher
+                    pass
+        finally:
+            if descriptor is not None:
+                os.close(descriptor)
+
+    def start(self):
+        """Starts watching the file in a background thread."""
+        self._thread = threading.Thread(target=self._run, name="roster-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()